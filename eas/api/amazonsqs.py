@@ -1,22 +1,88 @@
 import json
 import logging
+import time
 
-import boto3
 from django.conf import settings
 
+from . import aws, models
+
 LOGGER = logging.getLogger(__name__)
 
+MAX_BATCH_ENTRIES = 10  # SQS limits for SendMessageBatch
+MAX_BATCH_BYTES = 256 * 1024
+
+
+class BatchPublisher:
+    """Coalesces secret santa messages into SendMessageBatch calls
+
+    A batch is sent once it can't take another message without going over
+    the SQS limits, once its oldest message has waited max_delay seconds
+    or when flush() is called. Entries that SQS fails on its side are
+    retried on their own, the ids of the messages that couldn't be sent
+    are kept in failed along with their error. The ones SQS rejected as
+    the sender's fault, which would fail again, are also kept in rejected.
+    """
+
+    def __init__(self, max_delay=1.0, retries=2):
+        self.max_delay = max_delay
+        self.retries = retries
+        self.failed = {}
+        self.rejected = set()
+        self._entries = []
+        self._batch_bytes = 0
+        self._first_queued_at = None
+
+    def publish(self, message_id, message):
+        body = json.dumps(message)
+        size = len(body.encode())
+        if self._batch_bytes + size > MAX_BATCH_BYTES:
+            self.flush()
+        if not self._entries:
+            self._first_queued_at = time.monotonic()
+        self._entries.append({"Id": message_id, "MessageBody": body})
+        self._batch_bytes += size
+        if (
+            len(self._entries) == MAX_BATCH_ENTRIES
+            or time.monotonic() - self._first_queued_at >= self.max_delay
+        ):
+            self.flush()
+
+    def flush(self):
+        entries, self._entries, self._batch_bytes = self._entries, [], 0
+        for attempt in range(self.retries + 1):
+            if not entries:
+                return
+            entries = self._send(entries, retry=attempt < self.retries)
+
+    def _send(self, entries, retry):
+        """Sends a batch, returning the entries to retry"""
+        try:
+            response = aws.client("sqs").send_message_batch(
+                QueueUrl=settings.SECRET_SANTA_QUEUE_URL, Entries=entries
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            LOGGER.warning("Unable to send SQS batch", exc_info=True)
+            self.failed.update((entry["Id"], str(e)) for entry in entries)
+            return []
+        LOGGER.info("Sent SQS batch, response: %s", response)
+        entries_by_id = {entry["Id"]: entry for entry in entries}
+        to_retry = []
+        for failure in response.get("Failed", []):
+            if retry and not failure["SenderFault"]:
+                to_retry.append(entries_by_id[failure["Id"]])
+            else:
+                self.failed[failure["Id"]] = failure.get("Message", failure["Code"])
+            if failure["SenderFault"]:
+                self.rejected.add(failure["Id"])
+        return to_retry
+
 
-def send_secret_santa_message(message):
-    sqs_client = boto3.client(
-        "sqs",
-        region_name="us-east-2",
-        aws_access_key_id=settings.AWS_KEY_ID,
-        aws_secret_access_key=settings.AWS_KEY_SECRET,
-    )
+def queue_secret_santa_message(message):
+    """Stores the message to be sent by the send_outbox worker
 
-    response = sqs_client.send_message(
-        QueueUrl=settings.SECRET_SANTA_QUEUE_URL,
-        MessageBody=json.dumps(message),
-    )
-    LOGGER.info("Sent SQS message, response: %s", response)
+    Call it within the transaction that creates what the message refers
+    to, so the message is only sent if that transaction commits.
+    """
+    outbox_message = models.OutboxMessage.objects.create(payload=message)
+    LOGGER.info("Queued SQS message %s", outbox_message.id)
+    return outbox_message
@@ -0,0 +1,57 @@
+"""Process wide AWS clients
+
+boto3 clients are thread safe and keep a pool of connections, so a single
+client per service is shared by all the requests served by a process. This
+avoids resolving credentials, building the endpoint and opening a new TLS
+connection on every call.
+"""
+import threading
+
+import boto3
+from botocore.config import Config
+from django.conf import settings
+from django.core.signals import setting_changed
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _create_client(service_name):
+    return boto3.client(
+        service_name,
+        region_name=settings.AWS_REGION,
+        endpoint_url=settings.AWS_ENDPOINT_URL,
+        aws_access_key_id=settings.AWS_KEY_ID,
+        aws_secret_access_key=settings.AWS_KEY_SECRET,
+        config=Config(
+            max_pool_connections=settings.AWS_MAX_POOL_CONNECTIONS,
+            connect_timeout=settings.AWS_CONNECT_TIMEOUT,
+            read_timeout=settings.AWS_READ_TIMEOUT,
+        ),
+    )
+
+
+def client(service_name):
+    """Returns the client of the service, creating it on first use"""
+    try:
+        return _clients[service_name]
+    except KeyError:
+        pass
+    with _lock:
+        if service_name not in _clients:
+            _clients[service_name] = _create_client(service_name)
+        return _clients[service_name]
+
+
+def reset():
+    """Drops the clients so they are created again with the current settings"""
+    with _lock:
+        _clients.clear()
+
+
+def _reset_on_setting_changed(setting, **kwargs):  # pylint: disable=unused-argument
+    if setting.startswith("AWS_"):
+        reset()
+
+
+setting_changed.connect(_reset_on_setting_changed)
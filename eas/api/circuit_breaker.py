@@ -0,0 +1,118 @@
+"""Circuit breakers for the calls to the social network APIs
+
+A breaker opens when an upstream fails FAILURE_THRESHOLD times within
+FAILURE_WINDOW seconds. While open, calls fail right away with
+CircuitOpenError instead of holding the worker until a timeout. After
+RESET_TIMEOUT seconds the breaker is half-open: a single call is let
+through as a probe, which closes the breaker if it succeeds and opens it
+again otherwise. The state is kept in the cache named in
+settings.SOCIAL_CACHE, so it is shared by all the workers.
+
+The timeout of each call adapts to the latencies recently seen by the
+process: a multiple of their 99th percentile, within bounds.
+"""
+import collections
+import logging
+import statistics
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+
+LOG = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without calling the upstream while its breaker is open"""
+
+
+class CircuitBreaker:
+    FAILURE_THRESHOLD = 5  # Failures that open the breaker
+    FAILURE_WINDOW = 60  # seconds failures are counted for
+    RESET_TIMEOUT = 30  # seconds before a probe call is let through
+    MIN_TIMEOUT = 5  # seconds
+    MAX_TIMEOUT = 2 * 60  # seconds, also used until there are enough latencies
+    TIMEOUT_FACTOR = 3  # Timeout as a multiple of the 99th percentile latency
+    LATENCY_SAMPLES = 100  # Latencies kept to compute the timeout
+    MIN_LATENCY_SAMPLES = 20
+
+    def __init__(self, name):
+        self.name = name
+        self._latencies = collections.deque(maxlen=self.LATENCY_SAMPLES)
+        self._latencies_lock = threading.Lock()
+
+    def _cache(self):
+        return caches[settings.SOCIAL_CACHE]
+
+    def _key(self, name):
+        return f"circuit:{self.name}:{name}"
+
+    def timeout(self):
+        """Returns the timeout for the next call, in seconds"""
+        with self._latencies_lock:
+            latencies = list(self._latencies)
+        if len(latencies) < self.MIN_LATENCY_SAMPLES:
+            return self.MAX_TIMEOUT
+        p99 = statistics.quantiles(latencies, n=100, method="inclusive")[98]
+        return min(max(p99 * self.TIMEOUT_FACTOR, self.MIN_TIMEOUT), self.MAX_TIMEOUT)
+
+    def is_open(self):
+        return self._cache().get(self._key("opened_at")) is not None
+
+    def _before_call(self):
+        """Raises CircuitOpenError unless the call can go through
+
+        Returns whether the call is the probe of a half-open breaker.
+        """
+        cache = self._cache()
+        opened_at = cache.get(self._key("opened_at"))
+        if opened_at is None:
+            return False
+        if time.time() - opened_at < self.RESET_TIMEOUT:
+            raise CircuitOpenError(f"Circuit of {self.name} is open")
+        if not cache.add(self._key("probe"), True, timeout=self.MAX_TIMEOUT):
+            raise CircuitOpenError(f"Circuit of {self.name} is half-open")
+        LOG.info("Probing %s with a half-open circuit", self.name)
+        return True
+
+    def _record_success(self, latency, probe):
+        with self._latencies_lock:
+            self._latencies.append(latency)
+        if probe:
+            LOG.warning("Closing the circuit of %s", self.name)
+            self._cache().delete_many(
+                [self._key("opened_at"), self._key("failures"), self._key("probe")]
+            )
+
+    def _record_failure(self, probe):
+        cache = self._cache()
+        key = self._key("failures")
+        cache.add(key, 0, timeout=self.FAILURE_WINDOW)
+        try:
+            failures = cache.incr(key)
+        except ValueError:  # Expired right after being added
+            failures = 1
+        if probe or failures >= self.FAILURE_THRESHOLD:
+            LOG.warning("Opening the circuit of %s, %s failures", self.name, failures)
+            cache.set(self._key("opened_at"), time.time(), timeout=None)
+            cache.delete(self._key("probe"))
+
+    def get(self, session, url, **kwargs):
+        """Sends a GET request through the breaker, with the adaptive timeout
+
+        Connection errors, timeouts and 5xx responses count as failures.
+        """
+        probe = self._before_call()
+        start = time.monotonic()
+        try:
+            response = session.get(url, timeout=self.timeout(), **kwargs)
+        except requests.exceptions.RequestException:
+            self._record_failure(probe)
+            raise
+        if response.status_code >= 500:
+            self._record_failure(probe)
+        else:
+            self._record_success(time.monotonic() - start, probe)
+        return response
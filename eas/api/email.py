@@ -1,8 +1,7 @@
 """Email functionality using AWS SES"""
 import logging
 
-import boto3
-from django.conf import settings
+from . import aws
 
 LOGGER = logging.getLogger(__name__)
 
@@ -12,13 +11,7 @@ SENDER = "Echalo A Suerte <no-reply@echaloasuerte.com>"
 def send_magic_link(email, magic_link):
     """Send a magic link email to the user"""
 
-    # Create SES client using existing AWS credentials
-    ses_client = boto3.client(
-        "ses",
-        region_name="us-east-2",
-        aws_access_key_id=settings.AWS_KEY_ID,
-        aws_secret_access_key=settings.AWS_KEY_SECRET,
-    )
+    ses_client = aws.client("ses")
 
     # Email subject and body
     subject = "Tu enlace mágico - Échalo A Suerte"
@@ -1,14 +1,19 @@
+import functools
 import logging
 import re
+import urllib.parse
 from dataclasses import dataclass
 
-import instagrapi
 import requests
+from django.conf import settings
 
+from .. import social_cache
 from . import lamadava
 
 LOG = logging.getLogger(__name__)
 MENTION_RE = re.compile(r"(^|[^\w])@([\w\_\.]+)")
+SHORTCODE_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+SHORTCODE_RE = re.compile(r"/(?:[\w.]+/)?(?:p|reels?|tv)/([\w-]+)")
 ONE_MINUTE = 60
 
 NotFoundError = lamadava.NotFoundError
@@ -24,57 +29,106 @@ class Comment:
     userpic: str
 
 
-_CLIENT = instagrapi.Client()
+@functools.lru_cache(None)
+def _client():
+    # instagrapi is slow to import, only load it for the URLs we don't parse
+    import instagrapi  # pylint: disable=import-outside-toplevel
+
+    return instagrapi.Client()
+
+
+def _media_pk_from_shortcode(shortcode):
+    """Decodes the media pk from the base 64 shortcode of the post
+
+    Shortcodes of private posts append more characters to the ones of the
+    pk, which are always the first 11.
+    """
+    media_pk = 0
+    for char in shortcode[:11]:
+        media_pk = media_pk * len(SHORTCODE_ALPHABET) + SHORTCODE_ALPHABET.index(char)
+    return media_pk
 
 
 def _extract_media_pk(url):
     try:
-        return _CLIENT.media_pk_from_url(url)
-    except (ValueError, IndexError) as e:  # pragma: no cover
+        if match := SHORTCODE_RE.match(urllib.parse.urlparse(url).path):
+            return _media_pk_from_shortcode(match.group(1))
+        return _client().media_pk_from_url(url)
+    except (ValueError, IndexError) as e:
         LOG.info("Invalid instagram URL %r: %s", url, e)
         raise InvalidURL(f"Invalid URL: {url}") from e
 
 
-def _fetch_comments(url):
-    """Fetch all comments from instagram"""
-    media_pk = _extract_media_pk(url)
-    response = lamadava.fetch_comments(media_pk)
-    LOG.info("Fetched %s comments for %s", len(response), url)
-    if not response:  # pragma: no cover
-        raise NotFoundError(f"No posts found for {url}")
-    res = []
+def _parse_comments(response):
     for comment in response:
         try:
-            res.append(
-                Comment(
-                    id=comment["pk"],
-                    text=comment["text"],
-                    username=comment["user"]["username"],
-                    userpic=comment["user"]["profile_pic_url"],
-                )
+            yield Comment(
+                id=comment["pk"],
+                text=comment["text"],
+                username=comment["user"]["username"],
+                userpic=comment["user"]["profile_pic_url"],
             )
         except KeyError as e:  # pragma: no cover
             LOG.error(
                 "Comment does not contain field %s: %s", e, comment, exc_info=True
             )
-    return res
 
 
-def get_comments(url, min_mentions=0, require_like=False):  # pragma: no cover
-    """Fetch and filter comments"""
+def _fetch_comments(media_pk):
+    """Fetch all comments from instagram, lazily"""
+    fetched = 0
+    for comment in _parse_comments(lamadava.iter_comments(media_pk)):
+        fetched += 1
+        yield comment
+    LOG.info("Fetched %s comments for %s", fetched, media_pk)
+    if not fetched:  # pragma: no cover
+        raise NotFoundError(f"No posts found for {media_pk}")
+
+
+def _iter_comments(media_pk, min_mentions, max_comments):
+    """Yields the first comment of each user that matches the criteria
+
+    Pages are fetched as the comments are consumed, and no more are
+    fetched once there are max_comments users.
+    """
+    usernames = set()
+    for comment in _fetch_comments(media_pk):
+        if len(MENTION_RE.findall(comment.text)) < min_mentions:
+            continue
+        if comment.username in usernames:
+            continue
+        usernames.add(comment.username)
+        yield comment
+        if len(usernames) >= max_comments:
+            LOG.info("Reached %s commenters for %s", max_comments, media_pk)
+            return
+
+
+# A refreshed comment snapshot must not be built from the comments of the
+# previous one, so they expire together
+@social_cache.cached("instagram-comments", timeout=settings.COMMENT_SNAPSHOT_MAX_AGE)
+def _cached_comments(media_pk, min_mentions, max_comments):
+    return list(_iter_comments(media_pk, min_mentions, max_comments))
+
+
+def get_comments(url, min_mentions=0, require_like=False, max_comments=None):
+    """Fetch and filter comments
+
+    Comments are fetched until there are max_comments distinct users,
+    settings.INSTAGRAM_MAX_COMMENTS by default. The matching comments
+    are cached per post and criteria, rather than the pages.
+    """
     LOG.info(
         "Fetching comments for %r, mentions=%s, require_like=%s",
         url,
         min_mentions,
         require_like,
     )
-    ret = []
-    for comment in _fetch_comments(url):
-        if len(MENTION_RE.findall(comment.text)) < min_mentions:
-            continue
-        if require_like:
-            raise NotImplementedError("Not implemented")
-        ret.append(comment)
+    if require_like:
+        raise NotImplementedError("Not implemented")
+    if max_comments is None:
+        max_comments = settings.INSTAGRAM_MAX_COMMENTS
+    ret = _cached_comments(_extract_media_pk(url), min_mentions, max_comments)
     LOG.info("%s comments match criteria for %s", len(ret), url)
     return ret
 
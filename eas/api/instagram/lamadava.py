@@ -1,18 +1,18 @@
 import contextlib
-import datetime as dt
 import functools
 import json
 import logging
 
-import cachetools
 import requests
 import requests.adapters
 
+from eas.api import circuit_breaker, social_cache
+
 # from django.conf import settings
 
 LAMADAVA_APIK = "Q6m6DoTSKRdQEeThKixo06V0BxkFTzSF"
 LOG = logging.getLogger(__name__)
-ONE_MINUTE = 60  # seconds
+BREAKER = circuit_breaker.CircuitBreaker("lamadava")
 
 
 class NotFoundError(Exception):
@@ -26,7 +26,7 @@ class InvalidURL(Exception):
 @functools.lru_cache(None)
 def _session():  # pragma: no cover
     retry = requests.adapters.Retry(
-        total=3,
+        total=1,  # The circuit breaker bounds the time spent on failures
         backoff_factor=0.5,
         status_forcelist=[500, 503, 504, 520, 521, 522, 524],
     )
@@ -35,39 +35,39 @@ def _session():  # pragma: no cover
     return s
 
 
-@cachetools.cached(
-    cachetools.TTLCache(
-        maxsize=500,
-        timer=dt.datetime.now,
-        ttl=dt.timedelta(hours=1),
-    )
-)
-def fetch_comments(media_pk):  # pragma: no cover
+def fetch_comments_page(media_pk, page_id=None):  # pragma: no cover
+    """Returns the comments of a page and the id of the next one, if any"""
     try:
-        return _fetch_comments_v2(media_pk)
+        return _fetch_comments_v2(media_pk, page_id)
     except requests.exceptions.RequestException:
+        if page_id is not None:  # Pages can't be resumed with gql
+            raise
         LOG.info(
             "Failed to fetch comments via v2 API, falling back to gql", exc_info=True
         )
-    return _fetch_comments_gql(media_pk)
+    return _fetch_comments_gql(media_pk), None
 
 
-@cachetools.cached(
-    cachetools.TTLCache(
-        maxsize=500,
-        timer=dt.datetime.now,
-        ttl=dt.timedelta(hours=1),
-    )
-)
+def iter_comments(media_pk):  # pragma: no cover
+    """Yields the comments of the post, one page at a time"""
+    page_id = None
+    while True:
+        comments, page_id = fetch_comments_page(media_pk, page_id)
+        yield from comments
+        if not comments or not page_id:
+            return
+
+
+@social_cache.cached("lamadava-preview")
 def fetch_preview(url):  # pragma: no cover
     LOG.info("Fetching Instagram post preview for %s", url)
-    response = _session().get(
+    response = BREAKER.get(
+        _session(),
         "https://api.hikerapi.com/v1/media/by/url",
         params={
             "access_key": LAMADAVA_APIK,
             "url": url,
         },
-        timeout=ONE_MINUTE * 2,
     )
     if not response.ok:
         LOG.warning("Failed lamadava post preview request! %s", response.text)
@@ -84,28 +84,32 @@ def fetch_preview(url):  # pragma: no cover
     return response.json()
 
 
-def _fetch_comments_v2(media_pk):  # pragma: no cover
-    LOG.info("Sending request to lamadava for %s", media_pk)
-    response = _session().get(
+def _fetch_comments_v2(media_pk, page_id):  # pragma: no cover
+    LOG.info("Sending request to lamadava for %s, page %s", media_pk, page_id)
+    response = BREAKER.get(
+        _session(),
         "https://api.hikerapi.com/v2/media/comments",
         params={
             "id": media_pk,
+            "page_id": page_id,
             "access_key": LAMADAVA_APIK,
         },
-        timeout=ONE_MINUTE * 2,
     )
     if not response.ok:
         LOG.warning("Failed lamadava request! %s", response.text)
         with contextlib.suppress(KeyError, json.JSONDecodeError):
             if response.json()["exc_type"] == "NotFoundError":
-                return []
+                return [], None
             if response.json()["exc_type"] == "MediaUnavailable":
                 raise InvalidURL(f"Invalid id for instagram: {media_pk}")
             if response.json()["exc_type"] == "CommentsDisabled":
                 raise InvalidURL(f"Invalid id for instagram: {media_pk}")
     response.raise_for_status()
     try:
-        return response.json()["response"]["comments"]
+        return (
+            response.json()["response"]["comments"],
+            response.json().get("next_page_id"),
+        )
     except KeyError:
         LOG.warning("Failed lamadava request! %s", response.text)
         raise
@@ -113,14 +117,14 @@ def _fetch_comments_v2(media_pk):  # pragma: no cover
 
 def _fetch_comments_gql(media_pk):  # pragma: no cover
     LOG.info("Sending request to lamadava for %s", media_pk)
-    response = _session().get(
+    response = BREAKER.get(
+        _session(),
         "https://api.hikerapi.com/gql/comments",
         params={
             "media_id": media_pk,
             "amount": 50,
             "access_key": LAMADAVA_APIK,
         },
-        timeout=ONE_MINUTE * 2,
     )
     if not response.ok:
         LOG.warning("Failed lamadava request! %s", response.text)
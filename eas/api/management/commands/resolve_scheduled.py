@@ -0,0 +1,114 @@
+import datetime as dt
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from eas.api import models
+
+LOG = logging.getLogger(__name__)
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_INTERVAL = 5  # seconds
+MAX_ATTEMPTS = 10  # Failed resolutions before the results are left pending
+MAX_RETRY_DELAY = 60 * 60  # seconds
+
+
+def _retry_delay(attempts):
+    return dt.timedelta(seconds=min(60 * 2 ** (attempts - 1), MAX_RETRY_DELAY))
+
+
+def _claim_due_draw_ids(batch_size):
+    """Returns the ids of draws with due results, locking those results
+
+    Rows locked by other workers are skipped. On backends without
+    SELECT ... FOR UPDATE (sqlite) the results are not locked, but
+    BaseDraw.resolve_scheduled_results never overwrites a resolved result.
+    Results that failed to resolve are skipped until their resolve_after,
+    and for good after MAX_ATTEMPTS.
+    """
+    now = dt.datetime.now(dt.timezone.utc)
+    # Newly due first, so draws that keep failing do not starve the rest
+    due_results = (
+        models.Result.objects.filter(
+            value__isnull=True,
+            schedule_date__lte=now,
+            resolve_attempts__lt=MAX_ATTEMPTS,
+        )
+        .filter(Q(resolve_after__isnull=True) | Q(resolve_after__lte=now))
+        .order_by("-schedule_date")
+    )
+    if connection.features.has_select_for_update_skip_locked:  # pragma: no cover
+        due_results = due_results.select_for_update(skip_locked=True)
+    draw_ids = due_results.values_list("draw_id", flat=True)[:batch_size]
+    return list(dict.fromkeys(draw_ids))  # dedup keeping order
+
+
+def _concrete_draws(draw_ids):
+    """Fetches the draws as their concrete type, able to generate results"""
+    draws = {}
+    for model in models.DRAW_TYPES:
+        draws.update((draw.id, draw) for draw in model.objects.filter(id__in=draw_ids))
+    return [draws[draw_id] for draw_id in draw_ids if draw_id in draws]
+
+
+def _back_off(draw):
+    """Counts a failed attempt on the due results of the draw"""
+    now = dt.datetime.now(dt.timezone.utc)
+    results = list(
+        draw.results.filter(
+            value__isnull=True,
+            schedule_date__lte=now,
+            resolve_attempts__lt=MAX_ATTEMPTS,
+        )
+    )
+    for result in results:
+        result.resolve_attempts += 1
+        result.resolve_after = now + _retry_delay(result.resolve_attempts)
+        if result.resolve_attempts == MAX_ATTEMPTS:
+            LOG.warning("Giving up resolving %r of %r", result, draw)
+    models.Result.objects.bulk_update(results, ["resolve_attempts", "resolve_after"])
+
+
+def resolve_due_results(batch_size=DEFAULT_BATCH_SIZE):
+    """Resolves a batch of scheduled results whose date has passed
+
+    Returns the number of results resolved.
+    """
+    resolved = 0
+    with transaction.atomic():
+        for draw in _concrete_draws(_claim_due_draw_ids(batch_size)):
+            try:
+                with transaction.atomic():
+                    draw.ready_to_toss_check()
+                    resolved += draw.resolve_scheduled_results()
+            except Exception:  # pylint: disable=broad-except
+                LOG.info("Unable to resolve results of %r", draw, exc_info=True)
+                _back_off(draw)
+    if resolved:
+        LOG.info("Resolved %s scheduled results", resolved)
+    return resolved
+
+
+class Command(BaseCommand):  # pragma: no cover
+    help = "Resolves scheduled tosses whose date has passed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            default=False,
+            help="Keep polling for due results instead of exiting.",
+        )
+        parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL)
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        while True:
+            resolved = resolve_due_results(options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Resolved {resolved} results"))
+            if not options["loop"]:
+                break
+            if not resolved:
+                time.sleep(options["interval"])
@@ -0,0 +1,86 @@
+import datetime as dt
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from eas.api import amazonsqs, models
+
+LOG = logging.getLogger(__name__)
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_INTERVAL = 1  # seconds
+MAX_RETRY_DELAY = 300  # seconds
+MAX_ATTEMPTS = 20  # About an hour of retries
+
+
+def _retry_delay(attempts):
+    return dt.timedelta(seconds=min(2**attempts, MAX_RETRY_DELAY))
+
+
+def send_queued_messages(batch_size=DEFAULT_BATCH_SIZE):
+    """Sends a batch of the queued messages that are available
+
+    Messages are published with SendMessageBatch calls. Sent messages are
+    deleted, failed ones are retried later with an exponential backoff.
+    Messages SQS rejects as malformed or that fail MAX_ATTEMPTS times are
+    logged and deleted.
+    Messages are locked while being sent so other workers skip them. A
+    message can be sent twice if the worker dies after sending it but
+    before committing its deletion.
+
+    Returns the number of messages sent.
+    """
+    with transaction.atomic():
+        now = dt.datetime.now(dt.timezone.utc)
+        messages = models.OutboxMessage.objects.filter(available_at__lte=now)
+        if connection.features.has_select_for_update_skip_locked:  # pragma: no cover
+            messages = messages.select_for_update(skip_locked=True)
+        messages = list(messages.order_by("available_at")[:batch_size])
+        publisher = amazonsqs.BatchPublisher()
+        for message in messages:
+            publisher.publish(message.id, message.payload)
+        publisher.flush()
+
+        retried, dropped_ids = [], []
+        for message in messages:
+            if message.id not in publisher.failed:
+                continue
+            message.attempts += 1
+            error = publisher.failed[message.id]
+            if message.id in publisher.rejected or message.attempts >= MAX_ATTEMPTS:
+                LOG.error("Dropping %r, unable to send it: %s", message, error)
+                dropped_ids.append(message.id)
+            else:
+                LOG.warning("Unable to send %r: %s", message, error)
+                message.available_at = now + _retry_delay(message.attempts)
+                retried.append(message)
+        models.OutboxMessage.objects.bulk_update(retried, ["attempts", "available_at"])
+        sent_ids = [m.id for m in messages if m.id not in publisher.failed]
+        models.OutboxMessage.objects.filter(id__in=sent_ids + dropped_ids).delete()
+    if sent_ids:
+        LOG.info("Sent %s queued messages", len(sent_ids))
+    return len(sent_ids)
+
+
+class Command(BaseCommand):  # pragma: no cover
+    help = "Sends the messages queued in the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            default=False,
+            help="Keep polling for queued messages instead of exiting.",
+        )
+        parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL)
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        while True:
+            sent = send_queued_messages(options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"Sent {sent} messages"))
+            if not options["loop"]:
+                break
+            if not sent:
+                time.sleep(options["interval"])
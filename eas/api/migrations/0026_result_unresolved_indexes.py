@@ -0,0 +1,29 @@
+# Generated by Django 4.2.20 on 2026-10-17 19:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0025_add_return_url_to_login_token"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="result",
+            index=models.Index(
+                condition=models.Q(("value__isnull", True)),
+                fields=["draw", "schedule_date"],
+                name="result_unresolved_draw_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="result",
+            index=models.Index(
+                condition=models.Q(("value__isnull", True)),
+                fields=["schedule_date"],
+                name="result_unresolved_due_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.20 on 2026-10-17 20:41
+
+from django.db import migrations, models
+
+
+def drop_duplicated_facebook_participants(apps, schema_editor):
+    """Keeps only the first participant of each facebook_id within a draw"""
+    Participant = apps.get_model("api", "Participant")
+    earlier = Participant.objects.filter(
+        draw=models.OuterRef("draw"),
+        facebook_id=models.OuterRef("facebook_id"),
+    ).filter(
+        models.Q(created_at__lt=models.OuterRef("created_at"))
+        | models.Q(
+            created_at=models.OuterRef("created_at"), id__lt=models.OuterRef("id")
+        )
+    )
+    Participant.objects.filter(facebook_id__isnull=False).filter(
+        models.Exists(earlier)
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0026_result_unresolved_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            drop_duplicated_facebook_participants, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="participant",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("facebook_id__isnull", False)),
+                fields=("draw", "facebook_id"),
+                name="participant_unique_facebook_id",
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.20 on 2026-10-17 20:00
+
+import django.utils.timezone
+import jsonfield.fields
+from django.db import migrations, models
+
+import eas.api.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0027_participant_unique_facebook_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxMessage",
+            fields=[
+                (
+                    "id",
+                    models.CharField(
+                        default=eas.api.models.create_id,
+                        editable=False,
+                        max_length=64,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+                ("payload", jsonfield.fields.JSONField()),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                (
+                    "available_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["available_at"], name="outbox_available_idx")
+                ],
+            },
+        ),
+    ]
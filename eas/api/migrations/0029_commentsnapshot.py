@@ -0,0 +1,59 @@
+# Generated by Django 4.2.20 on 2026-10-17 20:32
+
+import django.db.models.deletion
+import django.utils.timezone
+import jsonfield.fields
+from django.db import migrations, models
+
+import eas.api.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0028_outboxmessage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CommentSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.CharField(
+                        default=eas.api.models.create_id,
+                        editable=False,
+                        max_length=64,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+                ("criteria", jsonfield.fields.JSONField()),
+                ("fetched_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("comment_count", models.PositiveIntegerField()),
+                ("data", models.BinaryField()),
+                (
+                    "draw",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="comment_snapshots",
+                        to="api.basedraw",
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.AddField(
+            model_name="result",
+            name="comment_snapshot",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="results",
+                to="api.commentsnapshot",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-17 21:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0029_commentsnapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="result",
+            name="resolve_after",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name="result",
+            name="resolve_attempts",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
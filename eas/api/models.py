@@ -2,22 +2,30 @@
 import contextlib
 import datetime as dt
 import enum
+import functools
 import itertools
+import json
 import random
 import string
 import uuid
+import zlib
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from jsonfield import JSONField
 
-from . import instagram, tiktok
+from . import instagram, response_cache, tiktok
 
 
 def create_id():
     return str(uuid.uuid4())
 
 
+class NotReadyToToss(Exception):
+    """The draw can't generate a result yet"""
+
+
 class BaseModel(models.Model):
     """Base Model for all the models"""
 
@@ -58,12 +66,22 @@ class BaseDraw(BaseModel, PayableMixin):
     title = models.TextField(null=True)
     description = models.TextField(null=True)
 
-    def toss(self):
-        """Generates and saves a result"""
-        return self._generate_result(
-            value=self.generate_result(),
-            draw=self,
-        )
+    def save(self, *args, **kwargs):  # pylint: disable=signature-differs
+        super().save(*args, **kwargs)
+        response_cache.invalidate_on_commit(self.id, self.private_id)
+
+    def delete(self, *args, **kwargs):  # pylint: disable=signature-differs
+        response_cache.invalidate_on_commit(self.id, self.private_id)
+        return super().delete(*args, **kwargs)
+
+    def toss(self, value=None):
+        """Saves a result, generating its value unless it is given"""
+        if value is None:
+            value = self.generate_result()
+        return self._generate_result(value=value, draw=self, **self._result_fields())
+
+    def ready_to_toss_check(self):
+        """Raises NotReadyToToss if the draw can't generate a result yet"""
 
     def schedule_toss(self, target_date):
         return self._generate_result(
@@ -72,33 +90,59 @@ class BaseDraw(BaseModel, PayableMixin):
         )
 
     def _generate_result(self, **kwargs):
-        if self.results.count() >= self.RESULTS_LIMIT:
-            self.results.order_by("created_at").first().delete()
         result_obj = Result(**kwargs)
         result_obj.save()  # Should we really save here???
+        if self._has_results_over_limit():
+            self._trim_results()
         return result_obj
 
+    def _has_results_over_limit(self):
+        latest = self.results.order_by("-created_at").values("id")
+        return latest[self.RESULTS_LIMIT : self.RESULTS_LIMIT + 1].exists()
+
+    def _trim_results(self):
+        """Deletes all but the latest RESULTS_LIMIT results in a single query
+
+        Every insert is followed by its own check, and trimming again is
+        harmless, so the limit holds once concurrent tosses are done
+        without locking the draw.
+        """
+        latest = self.results.order_by("-created_at").values("id")
+        self.results.exclude(id__in=latest[: self.RESULTS_LIMIT]).delete()
+
+    def _due_results(self):
+        return self.results.filter(
+            value__isnull=True, schedule_date__lte=dt.datetime.now(dt.timezone.utc)
+        )
+
     def has_unresolved_results(self):
         """Checks if there is any result pending resolution"""
-        for result in self.results.filter(
-            schedule_date__lte=dt.datetime.now(dt.timezone.utc)
-        ):
-            if result.value is None:
-                return True
-        return False
+        return self._due_results().exists()
 
     def resolve_scheduled_results(self):
-        """Resolves all scheduled results in the past"""
-        for result in self.results.filter(
-            schedule_date__lte=dt.datetime.now(dt.timezone.utc)
-        ):
-            if result.value is None:
-                result.value = self.generate_result()
-                result.save()
+        """Resolves all scheduled results in the past
+
+        A result is only written if it is still unresolved, so concurrent
+        resolutions of the same draw never overwrite each other.
+        Returns the number of results resolved.
+        """
+        resolved = 0
+        for result in self._due_results():
+            value = self.generate_result()
+            resolved += Result.objects.filter(id=result.id, value__isnull=True).update(
+                value=value, **self._result_fields()
+            )
+        if resolved:
+            self.save()  # Updates updated_at
+        return resolved
 
     def generate_result(self):  # pragma: no cover
         raise NotImplementedError()
 
+    def _result_fields(self):  # pylint: disable=no-self-use
+        """Fields other than the value of the last generated result"""
+        return {}
+
     def __repr__(self):  # pragma: nocover
         return "<%s  %r>" % (self.__class__.__name__, self.id)
 
@@ -119,17 +163,80 @@ class Result(BaseModel):
 
     The value of the result is stored in the value column as JSON. If
     the toss is scheduled for a future date, schedule_date will be set
-    to that date and value will be null.
+    to that date and value will be null. If the scheduler fails to
+    resolve it, it counts the attempt and retries after resolve_after.
     """
 
+    class Meta:
+        indexes = [
+            # Only scheduled results pending resolution are indexed
+            models.Index(
+                fields=["draw", "schedule_date"],
+                condition=models.Q(value__isnull=True),
+                name="result_unresolved_draw_idx",
+            ),
+            models.Index(
+                fields=["schedule_date"],
+                condition=models.Q(value__isnull=True),
+                name="result_unresolved_due_idx",
+            ),
+        ]
+
     draw = models.ForeignKey(BaseDraw, on_delete=models.CASCADE, related_name="results")
     value = JSONField(null=True)
     schedule_date = models.DateTimeField(null=True)
+    resolve_attempts = models.PositiveIntegerField(default=0)
+    resolve_after = models.DateTimeField(null=True)
+    comment_snapshot = models.ForeignKey(
+        "CommentSnapshot",
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="results",
+    )
 
     def __repr__(self):
         return "<%s  %r>" % (self.__class__.__name__, self.value)
 
 
+class CommentSnapshot(BaseModel):
+    """Comments of a social network post that results are drawn from
+
+    Holds the first comment of each user, keyed by username, as compressed
+    JSON. The criteria are the fields of the draw that filter the comments,
+    a snapshot is only reused while they don't change.
+    """
+
+    draw = models.ForeignKey(
+        BaseDraw, on_delete=models.CASCADE, related_name="comment_snapshots"
+    )
+    criteria = JSONField()
+    fetched_at = models.DateTimeField(default=timezone.now)
+    comment_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+
+    @classmethod
+    def build(cls, draw, criteria, comments):
+        """Returns an unsaved snapshot of the comments by username"""
+        return cls(
+            draw=draw,
+            criteria=criteria,
+            comment_count=len(comments),
+            data=zlib.compress(json.dumps(comments).encode()),
+        )
+
+    @functools.cached_property
+    def comments(self):
+        """The comments by username"""
+        return json.loads(zlib.decompress(self.data))
+
+    def __repr__(self):  # pragma: no cover
+        return "<%s(%r) comments=%r>" % (
+            self.__class__.__name__,
+            self.id,
+            self.comment_count,
+        )
+
+
 class MultiResultMixin(models.Model):
     """Allows to generate multiple results in a single toss"""
 
@@ -142,15 +249,29 @@ class MultiResultMixin(models.Model):
     def generate_result_item(self):  # pragma: nocover
         raise NotImplementedError()
 
+    def sample_result_items(self, count):  # pragma: nocover
+        """Generates count distinct items"""
+        raise NotImplementedError()
+
     def generate_result(self):
-        result = []
-        for _ in range(self.number_of_results):
-            while True:
-                item = self.generate_result_item()
-                if self.allow_repeated_results or item not in result:
-                    result.append(item)
-                    break
-        return result
+        if not self.allow_repeated_results:
+            return self.sample_result_items(self.number_of_results)
+        return [self.generate_result_item() for _ in range(self.number_of_results)]
+
+
+def sample_range(start, stop, count):
+    """Picks count distinct integers in [start, stop] in random order
+
+    Uses Floyd's algorithm, which needs exactly count random numbers and
+    O(count) memory regardless of the size of the range.
+    """
+    selected = set()
+    for upper in range(stop - count + 1, stop + 1):
+        item = random.randint(start, upper)
+        selected.add(upper if item in selected else item)
+    result = list(selected)
+    random.shuffle(result)
+    return result
 
 
 class RandomNumber(MultiResultMixin, BaseDraw):
@@ -160,11 +281,17 @@ class RandomNumber(MultiResultMixin, BaseDraw):
     def generate_result_item(self):
         return random.randint(self.range_min, self.range_max)
 
+    def sample_result_items(self, count):
+        return sample_range(self.range_min, self.range_max, count)
+
 
 class Letter(MultiResultMixin, BaseDraw):
     def generate_result_item(self):
         return random.choice(string.ascii_uppercase)
 
+    def sample_result_items(self, count):
+        return random.sample(string.ascii_uppercase, count)
+
 
 class Participant(BaseModel):
     """Models an user that interacts in a draw
@@ -174,6 +301,16 @@ class Participant(BaseModel):
     Even if it links to a draw, not all draws support it.
     """
 
+    class Meta:
+        constraints = [
+            # A facebook user can only take part once in each draw
+            models.UniqueConstraint(
+                fields=["draw", "facebook_id"],
+                condition=models.Q(facebook_id__isnull=False),
+                name="participant_unique_facebook_id",
+            ),
+        ]
+
     draw = models.ForeignKey(BaseDraw, on_delete=models.CASCADE)
 
     name = models.TextField(null=False)
@@ -205,30 +342,87 @@ class PrizesMixin:
 
     @property
     def prizes(self):
-        return Prize.objects.filter(draw=self)
+        return self.prize_set.all()  # pylint: disable=no-member
 
 
 class ParticipantsMixin:
     """Mixin to add an attribute to retrieve participants"""
 
     SERIALIZE_FIELDS = ["id", "name", "facebook_id"]  # Fields to serialize in a result
+    SAMPLE_CHUNK_SIZE = 2000  # Participant ids fetched at once when sampling
+    BULK_CREATE_BATCH_SIZE = 1000  # Participants inserted per query
 
     @property
     def participants(self):
-        return Participant.objects.filter(draw=self)
+        return self.participant_set.all()  # pylint: disable=no-member
+
+    def add_participants(self, participants):
+        """Inserts the given participant fields in batches
+
+        Participants whose facebook_id is already in the draw, or earlier in
+        the input, are skipped by the database. The input is consumed lazily
+        so it can be a generator. Returns the number of participants created.
+        """
+        participants = iter(participants)
+        with transaction.atomic():
+            initial_count = self.participants.count()
+            while batch := list(
+                itertools.islice(participants, self.BULK_CREATE_BATCH_SIZE)
+            ):
+                Participant.objects.bulk_create(
+                    [Participant(draw=self, **fields) for fields in batch],
+                    ignore_conflicts=True,
+                )
+            created = self.participants.count() - initial_count
+            self.save()  # Updates updated_at
+        return created
+
+    def sample_participants(self, count):
+        """Picks count random participants, all of them if there are fewer
+
+        The ids are streamed through a reservoir sample, so memory is
+        proportional to count and only the rows of the winners are loaded.
+        The winners are returned in random order.
+        """
+        reservoir = []
+        participant_ids = (
+            self.participants.order_by()
+            .values_list("id", flat=True)
+            .iterator(chunk_size=self.SAMPLE_CHUNK_SIZE)
+        )
+        for seen, participant_id in enumerate(participant_ids):
+            if seen < count:
+                reservoir.append(participant_id)
+                continue
+            index = random.randint(0, seen)
+            if index < count:
+                reservoir[index] = participant_id
+        random.shuffle(reservoir)
+        winners = {}
+        for start in range(0, len(reservoir), self.SAMPLE_CHUNK_SIZE):
+            chunk = reservoir[start : start + self.SAMPLE_CHUNK_SIZE]
+            winners.update(
+                (p["id"], p)
+                for p in Participant.objects.filter(id__in=chunk).values(
+                    *ParticipantsMixin.SERIALIZE_FIELDS
+                )
+            )
+        return [winners[participant_id] for participant_id in reservoir]
 
 
 class Raffle(BaseDraw, PrizesMixin, ParticipantsMixin):
+    def ready_to_toss_check(self):
+        if not self.participants.count():
+            raise NotReadyToToss(
+                f"The draw needs to have at least {self.prizes.count()}"
+                " participants."
+            )
+
     def generate_result(self):
         result = []
-        participants = list(
-            self.participants.values(*ParticipantsMixin.SERIALIZE_FIELDS)
-        )
-        random.shuffle(participants)
-        for prize, winner in zip(
-            self.prizes.values(*PrizesMixin.SERIALIZE_FIELDS),
-            itertools.cycle(participants),
-        ):
+        prizes = list(self.prizes.values(*PrizesMixin.SERIALIZE_FIELDS))
+        participants = self.sample_participants(len(prizes))
+        for prize, winner in zip(prizes, itertools.cycle(participants)):
             result.append(
                 {
                     "prize": prize,
@@ -241,17 +435,27 @@ class Raffle(BaseDraw, PrizesMixin, ParticipantsMixin):
 class Lottery(BaseDraw, ParticipantsMixin):
     number_of_results = models.PositiveIntegerField(default=1)
 
+    def ready_to_toss_check(self):
+        if self.participants.count() < self.number_of_results:
+            raise NotReadyToToss(
+                f"The draw needs to have at least {self.number_of_results}"
+                " participants."
+            )
+
     def generate_result(self):
-        participants = list(
-            self.participants.values(*ParticipantsMixin.SERIALIZE_FIELDS)
-        )
-        random.shuffle(participants)
-        return participants[0 : self.number_of_results]
+        return self.sample_participants(self.number_of_results)
 
 
 class Groups(BaseDraw, ParticipantsMixin):
     number_of_groups = models.PositiveIntegerField(null=False)
 
+    def ready_to_toss_check(self):
+        if self.participants.count() < self.number_of_groups:
+            raise NotReadyToToss(
+                f"The draw needs to have at least {self.number_of_groups}"
+                " participants."
+            )
+
     def generate_result(self):
         participants = list(
             self.participants.values(*ParticipantsMixin.SERIALIZE_FIELDS)
@@ -310,6 +514,30 @@ class SecretSantaResult(BaseModel):
         return repr(self)
 
 
+class OutboxMessage(BaseModel):
+    """A message to publish once the transaction that queued it commits
+
+    Messages are sent by the send_outbox worker, which deletes them once
+    they are sent and otherwise retries them from available_at.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["available_at"], name="outbox_available_idx"),
+        ]
+
+    payload = JSONField()
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+
+    def __repr__(self):  # pragma: no cover
+        return "<%s(%r) attempts=%r>" % (
+            self.__class__.__name__,
+            self.id,
+            self.attempts,
+        )
+
+
 class Payment(BaseModel):
     """Represents a Payment for a draw
 
@@ -345,6 +573,12 @@ class Payment(BaseModel):
     option_support = models.BooleanField(default=False)
     option_adfree = models.BooleanField(default=False)
 
+    def save(self, *args, **kwargs):  # pylint: disable=signature-differs
+        super().save(*args, **kwargs)
+        if self.draw_id:  # Payments change the serialized draw and its version
+            BaseDraw.objects.filter(pk=self.draw_id).update(updated_at=timezone.now())
+            response_cache.invalidate_on_commit(self.draw_id, self.draw.private_id)
+
     @staticmethod
     def fetch_payments(draw_id):
         return Payment.objects.filter(
@@ -424,24 +658,53 @@ class Tournament(BaseDraw, ParticipantsMixin):
         return result
 
 
-class Instagram(BaseDraw, PrizesMixin):
-    post_url = models.URLField()
-    use_likes = models.BooleanField(default=False)
-    min_mentions = models.IntegerField(default=0)
+class CommentSnapshotMixin:
+    """Draws the prizes among the comments of a post, through snapshots
+
+    The latest snapshot is reused for COMMENT_SNAPSHOT_MAX_AGE seconds.
+    Then a new one is taken with the users of the previous snapshot and
+    the ones that commented since. Results keep a reference to the
+    snapshot they were drawn from.
+    """
+
+    last_snapshot = None  # Snapshot of the last generated result
+
+    def _snapshot_criteria(self):  # pragma: no cover
+        raise NotImplementedError()
+
+    def _fetch_post_comments(self):  # pragma: no cover
+        """Fetches the comments that match the criteria, as dicts"""
+        raise NotImplementedError()
+
+    def comment_snapshot(self):
+        """Returns a recent snapshot of the comments, taking one if needed"""
+        criteria = self._snapshot_criteria()
+        latest = self.comment_snapshots.order_by("-fetched_at").first()
+        if latest is not None and latest.criteria != criteria:
+            latest = None
+        max_age = dt.timedelta(seconds=settings.COMMENT_SNAPSHOT_MAX_AGE)
+        if latest is not None and timezone.now() - latest.fetched_at < max_age:
+            return latest
+
+        comments = dict(latest.comments) if latest is not None else {}
+        for comment in self._fetch_post_comments():
+            comments.setdefault(comment["username"], comment)
+        snapshot = CommentSnapshot.build(self, criteria, comments)
+        snapshot.save()
+        # Older snapshots are only kept as the record of their results. A
+        # recent one may be about to be referenced by a concurrent toss.
+        self.comment_snapshots.exclude(pk=snapshot.pk).filter(
+            results__isnull=True, fetched_at__lt=snapshot.fetched_at - max_age
+        ).delete()
+        return snapshot
+
+    def ready_to_toss_check(self):
+        """Raises the social network errors if the comments can't be fetched"""
+        self.comment_snapshot()
 
     def fetch_comments(self):
-        comments = {
-            c.username: {
-                "username": c.username,
-                "userpic": c.userpic,
-                "text": c.text,
-                "id": c.id,
-            }
-            for c in instagram.get_comments(
-                self.post_url, self.min_mentions, require_like=self.use_likes
-            )
-        }  # dedup participants
-        comments = list(comments.values())
+        self.last_snapshot = self.comment_snapshot()
+        comments = list(self.last_snapshot.comments.values())
         random.shuffle(comments)
         return comments
 
@@ -455,14 +718,44 @@ class Instagram(BaseDraw, PrizesMixin):
             result.append({"prize": prize, "comment": winner})
         return result
 
+    def _result_fields(self):
+        return {"comment_snapshot": self.last_snapshot}
+
 
-class Tiktok(BaseDraw, PrizesMixin):
+class Instagram(CommentSnapshotMixin, BaseDraw, PrizesMixin):
     post_url = models.URLField()
+    use_likes = models.BooleanField(default=False)
     min_mentions = models.IntegerField(default=0)
 
-    def fetch_comments(self):
-        comments = {
-            c.username: {
+    def _snapshot_criteria(self):
+        return {
+            "post_url": self.post_url,
+            "use_likes": self.use_likes,
+            "min_mentions": self.min_mentions,
+        }
+
+    def _fetch_post_comments(self):
+        for c in instagram.get_comments(
+            self.post_url, self.min_mentions, require_like=self.use_likes
+        ):
+            yield {
+                "username": c.username,
+                "userpic": c.userpic,
+                "text": c.text,
+                "id": c.id,
+            }
+
+
+class Tiktok(CommentSnapshotMixin, BaseDraw, PrizesMixin):
+    post_url = models.URLField()
+    min_mentions = models.IntegerField(default=0)
+
+    def _snapshot_criteria(self):
+        return {"post_url": self.post_url, "min_mentions": self.min_mentions}
+
+    def _fetch_post_comments(self):
+        for c in tiktok.get_comments(self.post_url, self.min_mentions):
+            yield {
                 "text": c.text,
                 "id": c.id,
                 "url": c.url,
@@ -470,21 +763,6 @@ class Tiktok(BaseDraw, PrizesMixin):
                 "userid": c.userid,
                 "userpic": c.userpic,
             }
-            for c in tiktok.get_comments(self.post_url, self.min_mentions)
-        }  # dedup participants
-        comments = list(comments.values())
-        random.shuffle(comments)
-        return comments
-
-    def generate_result(self):
-        comments = self.fetch_comments()
-        result = []
-        for prize, winner in zip(
-            self.prizes.values(*PrizesMixin.SERIALIZE_FIELDS),
-            itertools.cycle(comments),
-        ):
-            result.append({"prize": prize, "comment": winner})
-        return result
 
 
 class Shifts(BaseDraw, ParticipantsMixin):
@@ -576,8 +854,6 @@ class LoginToken(BaseModel):
     def create_for_user(cls, user, return_url=None):
         """Create a new login token for user"""
 
-        from django.utils import timezone
-
         token = str(uuid.uuid4())
         expires_at = timezone.now() + dt.timedelta(
             minutes=settings.MAGIC_LINK_EXPIRATION_MINUTES
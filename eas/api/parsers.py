@@ -0,0 +1,57 @@
+"""Parsers for request bodies that carry a list of records
+
+Both parsers return a generator, so the records are decoded from the
+request stream as they are consumed.
+"""
+import codecs
+import csv
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+def _decoded_lines(stream, parser_context):
+    encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+    try:
+        yield from codecs.iterdecode(stream, encoding)
+    except UnicodeDecodeError as e:
+        raise ParseError(f"Invalid {encoding} data: {e}") from e
+
+
+class CSVParser(BaseParser):
+    """Parses a CSV body with a header row into a dict per row
+
+    Empty cells are returned as None.
+    """
+
+    media_type = "text/csv"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        reader = csv.DictReader(_decoded_lines(stream, parser_context))
+        try:
+            for row in reader:
+                yield {
+                    column: value or None
+                    for column, value in row.items()
+                    if column is not None
+                }
+        except csv.Error as e:
+            raise ParseError(f"CSV parse error - line {reader.line_num}: {e}") from e
+
+
+class NDJSONParser(BaseParser):
+    """Parses a newline delimited JSON body, skipping blank lines"""
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        lines = _decoded_lines(stream, parser_context)
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise ParseError(f"JSON parse error - line {line_number}: {e}") from e
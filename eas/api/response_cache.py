@@ -0,0 +1,78 @@
+"""Read-through cache of the serialized draws returned by the API
+
+Entries are keyed by the id used in the request, so the public and the
+private id of a draw cache the public and the owner variant of the
+payload respectively. Writes to a draw invalidate both variants once
+their transaction commits, so a read racing the write can't cache the
+old payload after the invalidation.
+
+The hit/miss counters are kept per process, updating them in the shared
+cache would add a write to every read.
+"""
+import collections
+import functools
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+LOG = logging.getLogger(__name__)
+
+_counters = collections.Counter()
+_counters_lock = threading.Lock()
+
+
+def _cache():
+    return caches[settings.DRAW_RESPONSE_CACHE]
+
+
+def _key(draw_id):
+    return f"draw-response:{draw_id}"
+
+
+def _incr(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def get(model, draw_id):
+    """Returns the cached (payload, version) of a draw or None"""
+    entry = _cache().get(_key(draw_id))
+    if entry is None or entry["model"] != model.__name__:
+        _incr("misses")
+        return None
+    _incr("hits")
+    return entry["data"], entry["version"]
+
+
+def put(model, draw_id, data, version=None):
+    """Stores the payload of a draw as returned for the given id
+
+    The version is opaque to the cache, the views use it to answer
+    conditional requests without serializing the draw.
+    """
+    _cache().set(
+        _key(draw_id), {"model": model.__name__, "data": data, "version": version}
+    )
+
+
+def invalidate(*draw_ids):
+    """Drops all the cached payloads of the given ids"""
+    LOG.debug("Invalidating cached responses for %s", draw_ids)
+    _cache().delete_many([_key(draw_id) for draw_id in draw_ids])
+
+
+def invalidate_on_commit(*draw_ids):
+    """Drops the cached payloads when the current transaction commits
+
+    Runs right away outside of a transaction.
+    """
+    transaction.on_commit(functools.partial(invalidate, *draw_ids))
+
+
+def stats():
+    """Returns the hit/miss counters of this process"""
+    with _counters_lock:
+        return {"hits": _counters["hits"], "misses": _counters["misses"]}
@@ -1,36 +1,162 @@
+"""Assignment of secret santa targets
+
+Finding who gives a present to whom is a perfect matching in the bipartite
+graph of allowed (source, target) pairs. A few random permutations are
+tried first, as an accepted one is uniform among the valid assignments. If
+none is valid, the participants are relabelled at random and Hopcroft-Karp
+repairs the pairs of the last permutation that break an exclusion. If no
+perfect matching exists the maximum matching found proves it (Hall's
+theorem), so there is no exhaustive search.
+
+The graph is walked as the complement of the exclusions: scanning the
+candidate targets of a source only skips targets it excludes, so a phase
+costs O(participants + exclusions) regardless of how dense the graph is.
+"""
 import random
 
+RANDOM_ATTEMPTS = 20  # Permutations tried before repairing one
+
+
+def _excluded_targets(participants, exclusions):
+    """Returns the set of targets each participant can't be assigned
+
+    Participants are referred to by their position, a participant can't be
+    assigned to itself nor to anyone with the same name.
+    """
+    positions = {}
+    for position, name in enumerate(participants):
+        positions.setdefault(name, []).append(position)
+    excluded = [set(positions[name]) for name in participants]
+    for source, target in exclusions:
+        for source_position in positions.get(source, ()):
+            excluded[source_position].update(positions.get(target, ()))
+    return excluded
 
-def _is_valid_assignment(source, target, exclusions):
-    if source == target:
-        return False
-    if (source, target) in exclusions:
-        return False
-    return True
 
+def _random_permutation(excluded):
+    """Shuffles the targets, checking each pair as it is drawn
 
-def _backtrack_assignments(participants, exclusions, assignments, targets):
-    if not participants:
-        return assignments
+    Returns the permutation and whether it is a valid assignment. The check
+    stops at the first excluded pair and the rest is shuffled in one go.
+    """
+    targets = list(range(len(excluded)))
+    for source, source_excluded in enumerate(excluded):
+        drawn = random.randrange(source, len(targets))
+        targets[source], targets[drawn] = targets[drawn], targets[source]
+        if targets[source] in source_excluded:
+            rest = targets[source + 1 :]
+            random.shuffle(rest)
+            targets[source + 1 :] = rest
+            return targets, False
+    return targets, True
 
-    source = participants[0]
-    random.shuffle(targets)  # Shuffle targets to ensure randomness
-    for target in targets:
-        if _is_valid_assignment(source, target, exclusions):
-            new_assignments = assignments + [(source, target)]
-            new_targets = targets[:]
-            new_targets.remove(target)
-            result = _backtrack_assignments(
-                participants[1:], exclusions, new_assignments, new_targets
-            )
-            if result:
-                return result
 
+def _candidate(targets, excluded):
+    """First target of the set that is not excluded, None if there is none"""
+    return next((target for target in targets if target not in excluded), None)
+
+
+def _build_layers(excluded, match, owner):
+    """BFS phase of Hopcroft-Karp from all the unmatched sources
+
+    Returns the sets of targets found at each distance, stopping at the
+    first one that contains an unmatched target. Returns None if there
+    are no augmenting paths, meaning the matching is maximum.
+    """
+    unvisited = set(range(len(excluded)))
+    frontier = [source for source, target in enumerate(match) if target is None]
+    layers = []
+    while frontier:
+        layer = set()
+        for source in frontier:
+            reached = [t for t in unvisited if t not in excluded[source]]
+            unvisited.difference_update(reached)
+            layer.update(reached)
+        layers.append(layer)
+        if any(owner[target] is None for target in layer):
+            return layers
+        frontier = [owner[target] for target in layer]
     return None
 
 
+def _augment(source, layers, excluded, match, owner):
+    """DFS phase of Hopcroft-Karp, iterative to support long paths
+
+    Targets are consumed from the layers as they are tried, so each one is
+    visited at most once per phase.
+    """
+    path = [source]
+    while path:
+        current = path[-1]
+        layer = layers[len(path) - 1]
+        target = _candidate(layer, excluded[current])
+        if target is None:  # Dead end, backtrack
+            path.pop()
+            continue
+        layer.discard(target)
+        if owner[target] is None:
+            for source_ in reversed(path):
+                match[source_], owner[target], target = target, source_, match[source_]
+            return True
+        if len(path) < len(layers):
+            path.append(owner[target])
+    return False
+
+
+def _maximum_matching(excluded, match):
+    """Grows the partial matching in place into a maximum one"""
+    owner = [None] * len(match)
+    for source, target in enumerate(match):
+        if target is not None:
+            owner[target] = source
+    while True:
+        layers = _build_layers(excluded, match, owner)
+        if layers is None:
+            return
+        for source, target in enumerate(match):
+            if target is None:
+                _augment(source, layers, excluded, match, owner)
+
+
 def resolve_secret_santa(
     participants,
     exclusions,
 ):
-    return _backtrack_assignments(participants, exclusions, [], participants[:])
+    """Assigns each participant a different one, honouring the exclusions
+
+    Exclusions are (source, target) pairs of names. Returns the list of
+    (source, target) pairs in the order of the participants or None if
+    there is no valid assignment.
+    """
+    count = len(participants)
+    order = random.sample(range(count), count)
+    shuffled = [participants[position] for position in order]
+    excluded = _excluded_targets(shuffled, exclusions)
+
+    times_excluded = [0] * count
+    for targets in excluded:
+        if len(targets) == count:  # Nobody to give a present to
+            return None
+        for target in targets:
+            times_excluded[target] += 1
+    if count in times_excluded:  # Nobody can give a present to them
+        return None
+
+    for _ in range(RANDOM_ATTEMPTS):
+        seed, valid = _random_permutation(excluded)
+        if valid:
+            break
+    match = [
+        target if target not in excluded[source] else None
+        for source, target in enumerate(seed)
+    ]
+    _maximum_matching(excluded, match)
+    if None in match:
+        return None
+
+    assignments = sorted(
+        (order[source], order[target]) for source, target in enumerate(match)
+    )
+    return [
+        (participants[source], participants[target]) for source, target in assignments
+    ]
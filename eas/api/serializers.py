@@ -65,12 +65,10 @@ class BaseSerializer(serializers.ModelSerializer):
 
     @classmethod
     def get_results(cls, instance):
-        return [
-            ResultSerializer(result).data
-            for result in models.Result.objects.filter(draw_id=instance.id).order_by(
-                "-created_at"
-            )
-        ]
+        results = instance.results.all()
+        if not results.ordered:  # Not prefetched by the view
+            results = results.order_by("-created_at")
+        return ResultSerializer(results, many=True).data
 
     @classmethod
     def get_payments(cls, instance):
@@ -184,7 +182,9 @@ class RaffleSerializer(BaseSerializer):
         participant_instances = [
             models.Participant(draw=draw, **participant) for participant in participants
         ]
-        models.Participant.objects.bulk_create(participant_instances)
+        models.Participant.objects.bulk_create(
+            participant_instances, ignore_conflicts=True
+        )
         return draw
 
 
@@ -203,7 +203,9 @@ class LotterySerializer(BaseSerializer):
         participant_instances = [
             models.Participant(draw=draw, **participant) for participant in participants
         ]
-        models.Participant.objects.bulk_create(participant_instances)
+        models.Participant.objects.bulk_create(
+            participant_instances, ignore_conflicts=True
+        )
         return draw
 
 
@@ -225,7 +227,9 @@ class GroupsSerializer(BaseSerializer):
         participant_instances = [
             models.Participant(draw=draw, **participant) for participant in participants
         ]
-        models.Participant.objects.bulk_create(participant_instances)
+        models.Participant.objects.bulk_create(
+            participant_instances, ignore_conflicts=True
+        )
         return draw
 
 
@@ -243,7 +247,9 @@ class TournamentSerializer(BaseSerializer):
         participant_instances = [
             models.Participant(draw=draw, **participant) for participant in participants
         ]
-        models.Participant.objects.bulk_create(participant_instances)
+        models.Participant.objects.bulk_create(
+            participant_instances, ignore_conflicts=True
+        )
         return draw
 
 
@@ -401,7 +407,9 @@ class ShiftsSerializer(BaseSerializer):
         participant_instances = [
             models.Participant(draw=draw, **participant) for participant in participants
         ]
-        models.Participant.objects.bulk_create(participant_instances)
+        models.Participant.objects.bulk_create(
+            participant_instances, ignore_conflicts=True
+        )
         return draw
 
 
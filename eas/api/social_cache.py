@@ -0,0 +1,146 @@
+"""Cache of the responses of the social network APIs
+
+Entries live in the Django cache named in settings.SOCIAL_CACHE, which is
+shared by all the workers and survives restarts, so a post is fetched from
+the paid APIs once per TTL. The TTL and the maximum number of entries are
+the ones of the cache alias.
+
+Misses are single-flight. Within a process, concurrent callers for the
+same key wait for the one that is fetching and share its result or error.
+Across processes, the fetching caller adds a lock entry next to the key
+and the others poll the cache until the value is stored or the lock is
+released. Errors are not cached, the next caller retries. The lock is
+atomic on Redis and the local memory cache, the file cache is best effort.
+"""
+import functools
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+LOG = logging.getLogger(__name__)
+
+LOCK_TIMEOUT = 5 * 60  # seconds, longer than a fetch with all its retries
+POLL_INTERVAL = 0.2  # seconds
+
+HITS_KEY = "social-stats:hits"
+ISSUED_KEY = "social-stats:issued"  # Upstream calls
+COALESCED_KEY = "social-stats:coalesced"  # Misses served by another fetch
+
+_MISSING = object()
+
+
+class _Flight:
+    """A fetch in progress, awaited by the other threads of the process"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _cache():
+    return caches[settings.SOCIAL_CACHE]
+
+
+def _key(prefix, args):
+    digest = hashlib.sha256(repr(args).encode()).hexdigest()
+    return f"social:{prefix}:{digest}"
+
+
+def _incr(key):
+    cache = _cache()
+    try:
+        cache.incr(key)
+    except ValueError:  # Counter expired or never set
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def _fetch_once(key, fetch, timeout):
+    """Fetches unless another process does it, then stores the value"""
+    cache = _cache()
+    lock_key = f"{key}:lock"
+    while not cache.add(lock_key, True, timeout=LOCK_TIMEOUT):
+        time.sleep(POLL_INTERVAL)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            _incr(COALESCED_KEY)
+            return value
+    try:
+        value = cache.get(key, _MISSING)  # Stored before the lock was added
+        if value is not _MISSING:
+            _incr(COALESCED_KEY)
+            return value
+        LOG.debug("Social cache miss for %s", key)
+        _incr(ISSUED_KEY)
+        value = fetch()
+        cache.set(key, value, timeout)
+        return value
+    finally:
+        cache.delete(lock_key)
+
+
+def get_or_fetch(key, fetch, timeout=DEFAULT_TIMEOUT):
+    """Returns the cached value of the key, calling fetch on a miss
+
+    The timeout of the value defaults to the one of the cache.
+    """
+    value = _cache().get(key, _MISSING)
+    if value is not _MISSING:
+        _incr(HITS_KEY)
+        return value
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if not leader:
+        flight.done.wait()
+        _incr(COALESCED_KEY)
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    try:
+        flight.value = _fetch_once(key, fetch, timeout)
+        return flight.value
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def cached(prefix, timeout=DEFAULT_TIMEOUT):
+    """Caches the results of the function by its positional arguments"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            return get_or_fetch(_key(prefix, args), lambda: func(*args), timeout)
+
+        return wrapper
+
+    return decorator
+
+
+def stats():
+    """Returns the counters of hits and upstream calls of all the workers"""
+    counters = _cache().get_many([HITS_KEY, ISSUED_KEY, COALESCED_KEY])
+    return {
+        "hits": counters.get(HITS_KEY, 0),
+        "issued": counters.get(ISSUED_KEY, 0),
+        "coalesced": counters.get(COALESCED_KEY, 0),
+    }
@@ -0,0 +1,11 @@
+import statistics
+
+
+def report_latencies(name, latencies):
+    """Prints the p50, p95 and p99 of the latencies, in seconds"""
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    print(
+        f"\n{name:<28} p50 {percentiles[49] * 1000:9.2f} ms"
+        f"  p95 {percentiles[94] * 1000:9.2f} ms"
+        f"  p99 {percentiles[98] * 1000:9.2f} ms"
+    )
@@ -0,0 +1,16 @@
+"""Benchmarks are opt-in, run them with `EAS_BENCHMARKS=1 make bench`"""
+import os
+import pathlib
+
+import pytest
+
+BENCH_DIR = pathlib.Path(__file__).parent
+
+
+def pytest_collection_modifyitems(items):
+    if "EAS_BENCHMARKS" in os.environ:
+        return
+    skip = pytest.mark.skip(reason="Benchmarks are opt-in")
+    for item in items:
+        if BENCH_DIR in item.path.parents:
+            item.add_marker(skip)
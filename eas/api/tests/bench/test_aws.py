@@ -0,0 +1,146 @@
+"""Latency of SQS calls with a new client per call vs the shared client
+
+A local HTTP stub stands in for SQS, so this measures the client side
+cost: credential and endpoint resolution plus connection setup (without
+TLS, which the shared client also saves in production).
+"""
+import hashlib
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+
+import pytest
+from django.conf import settings
+from django.test import override_settings
+
+from eas.api import amazonsqs, aws
+from eas.api.tests.bench.common import report_latencies
+
+CALLS = 300
+
+
+def _md5(body):
+    return hashlib.md5(body.encode()).hexdigest()
+
+
+def _json_response(action, request):
+    request = json.loads(request)
+    if action == "SendMessage":
+        return {"MessageId": "id", "MD5OfMessageBody": _md5(request["MessageBody"])}
+    return {
+        "Successful": [
+            {
+                "Id": e["Id"],
+                "MessageId": "id",
+                "MD5OfMessageBody": _md5(e["MessageBody"]),
+            }
+            for e in request["Entries"]
+        ],
+        "Failed": [],
+    }
+
+
+def _query_response(request):
+    request = urllib.parse.parse_qs(request.decode())
+    action = request["Action"][0]
+    if action == "SendMessage":
+        result = (
+            f"<MessageId>id</MessageId>"
+            f"<MD5OfMessageBody>{_md5(request['MessageBody'][0])}</MD5OfMessageBody>"
+        )
+    else:
+        prefix = "SendMessageBatchRequestEntry"
+        result = "".join(
+            f"<SendMessageBatchResultEntry><Id>{request[f'{prefix}.{i}.Id'][0]}</Id>"
+            "<MessageId>id</MessageId><MD5OfMessageBody>"
+            f"{_md5(request[f'{prefix}.{i}.MessageBody'][0])}"
+            "</MD5OfMessageBody></SendMessageBatchResultEntry>"
+            for i in range(1, 11)
+            if f"{prefix}.{i}.Id" in request
+        )
+    return f"<{action}Response><{action}Result>{result}</{action}Result></{action}Response>"
+
+
+class SQSStub(http.server.BaseHTTPRequestHandler):
+    """Answers SendMessage and SendMessageBatch in the JSON and query protocols"""
+
+    protocol_version = "HTTP/1.1"
+    wbufsize = 1 << 16  # Headers and body in one write, avoiding delayed ACKs
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        request = self.rfile.read(int(self.headers["Content-Length"]))
+        if target := self.headers.get("X-Amz-Target"):
+            content_type = "application/x-amz-json-1.0"
+            response = json.dumps(_json_response(target.split(".")[-1], request))
+        else:
+            content_type = "text/xml"
+            response = _query_response(request)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response.encode())
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+@pytest.fixture(name="endpoint")
+def fixture_endpoint():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SQSStub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    with override_settings(
+        AWS_ENDPOINT_URL=f"http://127.0.0.1:{server.server_port}",
+        AWS_KEY_SECRET="secret",
+        SECRET_SANTA_QUEUE_URL=f"http://127.0.0.1:{server.server_port}/queue",
+    ):
+        yield
+    server.shutdown()
+
+
+def _latencies(send):
+    send()  # Warm up imports and the shared client
+    latencies = []
+    for _ in range(CALLS):
+        start = time.perf_counter()
+        send()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _send_message(client):
+    client.send_message(QueueUrl=settings.SECRET_SANTA_QUEUE_URL, MessageBody="{}")
+
+
+def test_client_per_call(endpoint):  # pylint: disable=unused-argument
+    # pylint: disable=protected-access
+    report_latencies(
+        "client per call",
+        _latencies(lambda: _send_message(aws._create_client("sqs"))),
+    )
+
+
+def test_shared_client(endpoint):  # pylint: disable=unused-argument
+    report_latencies(
+        "shared client", _latencies(lambda: _send_message(aws.client("sqs")))
+    )
+
+
+def test_batched_messages(endpoint):  # pylint: disable=unused-argument
+    """Sending 10 messages, one call each vs coalesced in a batch"""
+
+    def send_one_by_one():
+        for _ in range(amazonsqs.MAX_BATCH_ENTRIES):
+            _send_message(aws.client("sqs"))
+
+    def send_batched():
+        publisher = amazonsqs.BatchPublisher()
+        for i in range(amazonsqs.MAX_BATCH_ENTRIES):
+            publisher.publish(str(i), {})
+        assert not publisher.failed
+
+    report_latencies("10 x SendMessage", _latencies(send_one_by_one))
+    report_latencies("1 x SendMessageBatch", _latencies(send_batched))
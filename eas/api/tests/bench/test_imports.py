@@ -0,0 +1,54 @@
+"""Startup time of a process that loads the models, with `python -X importtime`
+
+Each case runs in a fresh interpreter, the ones that import instagrapi
+up front show what every process paid before it was loaded lazily.
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+import pytest
+
+RUNS = 5
+SETUP = "import django; django.setup()"
+
+
+def _import_times(code):
+    """Returns the time of the top level imports in µs and the modules imported"""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env={**os.environ, "DJANGO_SETTINGS_MODULE": "eas.settings.local"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total, modules = 0, set()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():  # Header
+            continue
+        modules.add(name.strip())
+        if not name.startswith("  "):
+            total += int(cumulative)
+    return total, modules
+
+
+@pytest.mark.parametrize(
+    "name, code",
+    [
+        ("models", SETUP),
+        ("models + instagrapi", f"import instagrapi; {SETUP}"),
+    ],
+)
+def test_startup(name, code):
+    totals = []
+    for _ in range(RUNS):
+        total, modules = _import_times(code)
+        totals.append(total)
+    print(
+        f"\n{name:<20} imports {statistics.median(totals) / 1000:7.1f} ms"
+        f" (instagrapi loaded: {'instagrapi' in modules})"
+    )
@@ -0,0 +1,69 @@
+"""Instagram comment pipeline benchmark on a post with 50k comments
+
+Pages are generated on demand, so the peak memory is the one of the
+pipeline: one page plus the comments kept.
+"""
+import time
+import tracemalloc
+import unittest.mock
+
+import pytest
+from django.conf import settings
+
+from eas.api import instagram
+
+COMMENT_COUNT = 50_000
+PAGE_SIZE = 50
+USER_COUNT = 30_000  # Some users comment more than once
+URL = "https://www.instagram.com/p/C8eqdxpoiDz/"
+BUDGETS = tuple(
+    tier["max_instagram_comments"] for tier in settings.SUBSCRIPTION_TIERS.values()
+)
+
+
+def _comment(i):
+    username = f"user{i * 7919 % USER_COUNT}"
+    return {
+        "pk": str(i),
+        "text": f"Comment {i} @friend{i}" if i % 3 else f"Comment {i}",
+        "user": {
+            "username": username,
+            "profile_pic_url": f"https://instagram.example/{username}.jpg",
+        },
+    }
+
+
+class Pages:
+    def __init__(self):
+        self.fetched = 0
+
+    def __call__(self, _, page_id=None):
+        self.fetched += 1
+        start = int(page_id or 0)
+        end = min(start + PAGE_SIZE, COMMENT_COUNT)
+        return [_comment(i) for i in range(start, end)], (
+            str(end) if end < COMMENT_COUNT else None
+        )
+
+
+@pytest.mark.parametrize("min_mentions", (0, 1))
+@pytest.mark.parametrize("budget", BUDGETS)
+def test_get_comments(budget, min_mentions):
+    pages = Pages()
+    with unittest.mock.patch.object(
+        instagram.lamadava, "fetch_comments_page", side_effect=pages
+    ):
+        tracemalloc.start()
+        start = time.perf_counter()
+        comments = instagram.get_comments(
+            URL, min_mentions=min_mentions, max_comments=budget
+        )
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    assert len(comments) == len({c.username for c in comments})
+    print(
+        f"\nbudget {budget:>10}, mentions {min_mentions}: {len(comments):>6} users,"
+        f" {pages.fetched:>4} pages, {elapsed * 1000:8.1f} ms,"
+        f" peak {peak / 1024:8.1f} KiB"
+    )
@@ -0,0 +1,41 @@
+"""Winner selection benchmark for raffles with many participants"""
+import time
+import tracemalloc
+
+from django.test import TestCase
+
+from eas.api import models
+from eas.api.tests.factories import RaffleFactory
+
+PARTICIPANT_COUNTS = (10_000, 100_000, 1_000_000)
+PRIZE_COUNT = 10
+INSERT_BATCH_SIZE = 10_000
+
+
+class RaffleBenchmark(TestCase):
+    def _raffle_with(self, participant_count):
+        draw = RaffleFactory(
+            prizes=[{"name": f"prize {i}"} for i in range(PRIZE_COUNT)],
+            participants=[],
+        )
+        for start in range(0, participant_count, INSERT_BATCH_SIZE):
+            models.Participant.objects.bulk_create(
+                models.Participant(draw=draw, name=f"participant {i}")
+                for i in range(start, min(start + INSERT_BATCH_SIZE, participant_count))
+            )
+        return draw
+
+    def test_generate_result(self):
+        for participant_count in PARTICIPANT_COUNTS:
+            draw = self._raffle_with(participant_count)
+            tracemalloc.start()
+            start = time.perf_counter()
+            result = draw.generate_result()
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            assert len(result) == PRIZE_COUNT
+            print(
+                f"\n{participant_count:>9} participants: "
+                f"{elapsed * 1000:8.1f} ms, peak {peak / 1024:8.1f} KiB"
+            )
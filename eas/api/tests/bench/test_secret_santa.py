@@ -0,0 +1,97 @@
+"""Secret santa solver latency and fairness benchmark"""
+import collections
+import random
+import time
+
+import pytest
+
+from eas.api.secret_santa import resolve_secret_santa
+from eas.api.tests.bench.common import report_latencies
+from eas.api.tests.test_secret_santa import chi_square
+
+PARTICIPANT_COUNTS = (10, 100, 1000, 5000)
+EXCLUSION_DENSITIES = (0, 0.01, 0.1, 0.5)  # Share of the group each one excludes
+MAX_EXCLUSIONS = 500  # Per participant, as accepted by the API
+FAIRNESS_RUNS = 200  # Per participant
+
+
+def _group(count, density, rng):
+    participants = [f"participant {i}" for i in range(count)]
+    excluded_count = min(int(density * count), MAX_EXCLUSIONS)
+    exclusions = [
+        (source, target)
+        for source in participants
+        for target in rng.sample(participants, excluded_count)
+    ]
+    return participants, exclusions
+
+
+def _infeasible_group(count, rng):
+    """The last participants can only get a present from fewer people
+
+    Hall's condition fails, but only once the matching gets to them.
+    """
+    participants, exclusions = _group(count, 0.01, rng)
+    unreachable = participants[-(count // 2) :][:10]
+    exclusions += [
+        (source, target)
+        for source in participants[len(unreachable) - 1 :]
+        for target in unreachable
+    ]
+    return participants, exclusions
+
+
+def _latencies(participants, exclusions):
+    runs = max(5, min(200, 20_000 // len(participants)))
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        resolve_secret_santa(participants, exclusions)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+@pytest.mark.parametrize("density", EXCLUSION_DENSITIES)
+@pytest.mark.parametrize("count", PARTICIPANT_COUNTS)
+def test_feasible(count, density):
+    participants, exclusions = _group(count, density, random.Random(count))
+    assert resolve_secret_santa(participants, exclusions) is not None
+    report_latencies(
+        f"{count} x {density:.0%} excluded", _latencies(participants, exclusions)
+    )
+
+
+@pytest.mark.parametrize("count", PARTICIPANT_COUNTS)
+def test_infeasible(count):
+    participants, exclusions = _infeasible_group(count, random.Random(count))
+    assert resolve_secret_santa(participants, exclusions) is None
+    report_latencies(f"{count} infeasible", _latencies(participants, exclusions))
+
+
+@pytest.mark.parametrize("density", EXCLUSION_DENSITIES[:3])
+def test_fairness(density):
+    """Chi-square of the targets given to each participant
+
+    Without exclusions every target is equally likely, so the statistic
+    should be close to its degrees of freedom. With exclusions the targets
+    aren't equally likely, the score is reported to catch changes.
+    """
+    count = 10
+    participants, exclusions = _group(count, density, random.Random(count))
+    excluded = set(exclusions)
+    counts = collections.Counter()
+    for _ in range(FAIRNESS_RUNS * count):
+        counts.update(resolve_secret_santa(participants, exclusions))
+    score = degrees = 0
+    for source in participants:
+        targets = [
+            target
+            for target in participants
+            if target != source and (source, target) not in excluded
+        ]
+        source_counts = collections.Counter(
+            {target: counts[source, target] for target in targets}
+        )
+        score += chi_square(source_counts, targets)
+        degrees += len(targets) - 1
+    print(f"\n{count} x {density:.0%} excluded: chi-square {score:.1f} ({degrees} df)")
@@ -2,10 +2,15 @@ import datetime as dt
 import json
 
 import dateutil.parser
-from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
 from rest_framework import status
 
-from eas.api import models
+from eas.api import models, response_cache
+from eas.api.management.commands import resolve_scheduled
+
+from ..factories import MetadataFactory
 
 
 class CustomJsonEncoder(json.JSONEncoder):
@@ -108,6 +113,150 @@ class DrawAPITestMixin:
         self.assertEqual(response.data.keys(), expected_result.keys())
         self.assertEqual(response.data, expected_result)
 
+    def test_retrieve_not_found(self):
+        url = reverse(f"{self.base_url}-detail", kwargs=dict(pk="missing-id"))
+        response = self.client.get(url)
+        self.assertEqual(
+            response.status_code, status.HTTP_404_NOT_FOUND, response.content
+        )
+
+    def test_draw_lookup_single_query(self):
+        url = reverse(f"{self.base_url}-detail", kwargs=dict(pk=self.draw.id))
+        view = resolve(url).func.cls()
+        for pk, expected_access in [
+            (self.draw.id, False),
+            (self.draw.private_id, True),
+        ]:
+            with CaptureQueriesContext(connection) as queries:
+                (
+                    draw,
+                    write_access,
+                ) = view._get_draw_with_access(  # pylint: disable=protected-access
+                    pk
+                )
+            self.assertEqual(1, len(queries))
+            self.assertEqual(draw.id, self.draw.id)
+            self.assertEqual(write_access, expected_access)
+
+    def test_retrieve_query_count_is_constant(self):
+        url = reverse(f"{self.base_url}-detail", kwargs=dict(pk=self.draw.private_id))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        empty_draw_queries = len(queries)
+
+        for _ in range(5):
+            self.draw.toss()
+        MetadataFactory.create_batch(size=3, draw=self.draw)
+        for _ in range(3):
+            models.Payment.objects.create(
+                draw_id=self.draw.id, payed=True, option_certified=True
+            )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual(5, len(response.data["results"]))
+        self.assertEqual(empty_draw_queries, len(queries))
+        self.assertLessEqual(len(queries), 7)
+
+    def test_retrieve_is_cached(self):
+        url = reverse(f"{self.base_url}-detail", kwargs=dict(pk=self.draw.id))
+        first_response = self.client.get(url)
+        self.assertEqual(
+            first_response.status_code, status.HTTP_200_OK, first_response.content
+        )
+        hits = response_cache.stats()["hits"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(0, len(queries))
+        self.assertEqual(response.data, first_response.data)
+        self.assertEqual(hits + 1, response_cache.stats()["hits"])
+
+        private_url = reverse(
+            f"{self.base_url}-detail", kwargs=dict(pk=self.draw.private_id)
+        )
+        response = self.client.get(private_url)
+        self.assertEqual(response.data["private_id"], self.draw.private_id)
+        response = self.client.get(url)
+        self.assertNotIn("private_id", response.data)
+
+    def test_toss_invalidates_cached_draw(self):
+        url = reverse(f"{self.base_url}-detail", kwargs=dict(pk=self.draw.id))
+        response = self.client.get(url)
+        self.assertEqual([], response.data["results"])
+        toss_url = reverse(
+            f"{self.base_url}-toss", kwargs=dict(pk=str(self.draw.private_id))
+        )
+        self.client.post(toss_url)
+        response = self.client.get(url)
+        self.assertEqual(1, len(response.data["results"]))
+
+    def test_retrieve_not_modified(self):
+        url = reverse(f"{self.base_url}-detail", kwargs=dict(pk=self.draw.id))
+        response = self.client.get(url)
+        etag = response["ETag"]
+        last_modified = response["Last-Modified"]
+
+        for headers in [
+            dict(HTTP_IF_NONE_MATCH=etag),
+            dict(HTTP_IF_MODIFIED_SINCE=last_modified),
+        ]:
+            self.client.get(url)  # Populates the cache
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, **headers)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response["ETag"], etag)
+            self.assertEqual(0, len(queries))  # Served from the cache
+
+            response_cache.invalidate(self.draw.id)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, **headers)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(1, len(queries))  # Version only, no serialization
+
+        toss_url = reverse(
+            f"{self.base_url}-toss", kwargs=dict(pk=str(self.draw.private_id))
+        )
+        self.client.post(toss_url)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(1, len(response.data["results"]))
+
+    def test_payment_changes_the_draw_version(self):
+        url = reverse(f"{self.base_url}-detail", kwargs=dict(pk=self.draw.id))
+        etag = self.client.get(url)["ETag"]
+        models.Payment.objects.create(draw_id=self.draw.id, payed=True)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_retrieve_not_modified_unknown_draw(self):
+        url = reverse(f"{self.base_url}-detail", kwargs=dict(pk="missing-id"))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"etag"')
+        self.assertEqual(
+            response.status_code, status.HTTP_404_NOT_FOUND, response.content
+        )
+
+    def test_retrieve_does_not_resolve_due_results(self):
+        url = reverse(f"{self.base_url}-detail", kwargs=dict(pk=self.draw.id))
+        target_date = dt.datetime.now(dt.timezone.utc) + dt.timedelta(days=1)
+        self.draw.schedule_toss(target_date)
+        self.draw.save()
+        response = self.client.get(url)
+        etag = response["ETag"]
+
+        self.draw.results.update(schedule_date=target_date - dt.timedelta(days=2))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIsNone(self.draw.results.get().value)
+
+        resolve_scheduled.resolve_due_results()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertIsNotNone(response.data["results"][0]["value"])
+        self.assertNotEqual(response["ETag"], etag)
+
     def test_toss(self):
         url = reverse(
             f"{self.base_url}-toss", kwargs=dict(pk=str(self.draw.private_id))
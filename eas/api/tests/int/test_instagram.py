@@ -1,9 +1,12 @@
+# pylint: disable=protected-access
 import json
 import pathlib
 from unittest.mock import ANY, patch
 
+import freezegun
 import pytest
 import requests.exceptions
+from django.conf import settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APILiveServerTestCase
@@ -22,7 +25,7 @@ def lamadava_fake():
     ).resolve().open() as f:
         lamadava_response = json.load(f)
         with patch("eas.api.instagram.lamadava") as lamadava_mock:
-            lamadava_mock.fetch_comments.return_value = lamadava_response
+            lamadava_mock.iter_comments.side_effect = lambda _: iter(lamadava_response)
             yield lamadava_mock
 
 
@@ -93,6 +96,7 @@ class TestInstagram(DrawAPITestMixin, APILiveServerTestCase):
                 "comment": {"username": ANY, "text": ANY, "id": ANY, "userpic": ANY},
             }
         ]
+        instagram_mock.assert_called_once()  # Not fetched again to check
 
     @patch("eas.api.instagram.get_comments")
     def test_toss_without_comments(self, instagram_mock):
@@ -217,6 +221,8 @@ class TestInstagram(DrawAPITestMixin, APILiveServerTestCase):
         assert retossed_result.value[0] != item_to_repeat
         assert initial_result.value[0] == item_to_repeat
         assert retossed_result.value[1] == initial_result.value[1]
+        instagram_mock.assert_called_once()  # The retoss reuses the snapshot
+        assert retossed_result.comment_snapshot == initial_result.comment_snapshot
 
 
 class TestInstagramPurge(PurgeMixin, APILiveServerTestCase):
@@ -262,3 +268,102 @@ class TestPreview(APILiveServerTestCase):
         url = reverse("instagram-preview")
         response = self.client.post(url, {"url": post_url})
         self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@pytest.mark.usefixtures("lamadava_fake")
+class TestGetComments:
+    URL = "https://www.instagram.com/p/C8eqdxpoiDz/"
+
+    def test_one_comment_per_user(self):
+        response = list(instagram.lamadava.iter_comments(None))
+        repeated = [{**c, "pk": f"{c['pk']}-repeated"} for c in response[:5]]
+        instagram.lamadava.iter_comments.side_effect = lambda _: iter(
+            response + repeated
+        )
+        comments = instagram.get_comments(self.URL)
+        assert [c.id for c in comments] == [c["pk"] for c in response]
+
+    def test_min_mentions(self):
+        comments = instagram.get_comments(self.URL, min_mentions=1)
+        assert comments
+        for comment in comments:
+            assert instagram.MENTION_RE.search(comment.text)
+
+    def test_stops_at_max_comments(self):
+        response = list(instagram.lamadava.iter_comments(None))
+        consumed = []
+
+        def iter_comments(_):
+            for comment in response:
+                consumed.append(comment)
+                yield comment
+
+        instagram.lamadava.iter_comments.side_effect = iter_comments
+        comments = instagram.get_comments(self.URL, max_comments=3)
+        assert len(comments) == 3
+        assert len(consumed) < len(response)
+        assert consumed[-1]["pk"] == comments[-1].id
+
+    def test_comments_are_cached_per_criteria(
+        self, lamadava_fake
+    ):  # pylint: disable=redefined-outer-name
+        instagram.get_comments(self.URL)
+        instagram.get_comments(self.URL.rstrip("/"))  # Same post
+        assert lamadava_fake.iter_comments.call_count == 1
+        instagram.get_comments(self.URL, min_mentions=1)
+        assert lamadava_fake.iter_comments.call_count == 2
+
+    def test_comments_expire_with_the_snapshots(
+        self, lamadava_fake
+    ):  # pylint: disable=redefined-outer-name
+        with freezegun.freeze_time() as frozen_time:
+            instagram.get_comments(self.URL)
+            frozen_time.tick(settings.COMMENT_SNAPSHOT_MAX_AGE - 1)
+            instagram.get_comments(self.URL)
+            assert lamadava_fake.iter_comments.call_count == 1
+            frozen_time.tick(1)
+            instagram.get_comments(self.URL)
+        assert lamadava_fake.iter_comments.call_count == 2
+
+    def test_require_like_is_not_supported(self):
+        with pytest.raises(NotImplementedError):
+            instagram.get_comments(self.URL, require_like=True)
+
+
+class TestExtractMediaPk:
+    @pytest.mark.parametrize(
+        "url, media_pk",
+        [
+            ("https://instagram.com/p/B1LbfVPlwIA/", 2110901750722920960),
+            (
+                "https://www.instagram.com/p/B-fKL9qpeab/?igshid=1xm76zkq7o1im",
+                2278584739065882267,
+            ),
+            (
+                "https://www.instagram.com/p/CCQQsCXjOaBfS3I2PpqsNkxElV9DXj61vzo5xs0/",
+                2346448800803776129,
+            ),
+            ("https://www.instagram.com/reel/B1LbfVPlwIA", 2110901750722920960),
+            ("https://www.instagram.com/user.name/p/B1LbfVPlwIA/", 2110901750722920960),
+        ],
+    )
+    def test_shortcode(self, url, media_pk):
+        with patch("eas.api.instagram._client") as client:
+            assert instagram._extract_media_pk(url) == media_pk
+        client.assert_not_called()
+
+    def test_other_urls_use_instagrapi(self):
+        url = "https://www.instagram.com/B1LbfVPlwIA"
+        assert instagram._extract_media_pk(url) == 2110901750722920960
+
+    @pytest.mark.parametrize(
+        "url",
+        [
+            "https://www.instagram.com/p/B1LbfñPlwIA/",
+            "https://www.instagram.com/tintin.personal.shopper/?next=%2Fajinomai%2F",
+            "https://www.instagram.com/",
+        ],
+    )
+    def test_invalid(self, url):
+        with pytest.raises(instagram.InvalidURL):
+            instagram._extract_media_pk(url)
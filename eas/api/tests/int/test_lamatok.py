@@ -1,11 +1,14 @@
 # pylint: disable=redefined-outer-name
+import json
 import os
 import pathlib
 import unittest.mock
 
 import pytest
+import requests
 import requests_mock
 
+from eas.api import circuit_breaker, tiktok
 from eas.api.tiktok import InvalidURL, NotFoundError, get_comments
 
 RESPONSES_PATH = pathlib.Path(__file__, "..", "data").resolve()
@@ -83,3 +86,120 @@ def test_min_mentions_filter(requestsm):
     assert len(comments) == 13
     comments = get_comments(url, min_mentions=3)
     assert len(comments) == 0
+
+
+def _page(comments, cursor, has_more=1):
+    return {
+        "json": {
+            **json.loads(SUCCESS_RESPONSE),
+            "comments": comments,
+            "cursor": cursor,
+            "has_more": has_more,
+        }
+    }
+
+
+def test_pagination(requestsm):
+    url = "https://www.tiktok.com/@fanmallorcashopping/video/7385245034506964257"
+    comments = json.loads(SUCCESS_RESPONSE)["comments"]
+    mock = requestsm.get(
+        "https://api.lamatok.com/v1/media/comments/by/id",
+        [
+            _page(comments[:10], 10),
+            _page(comments[8:15], 15),  # Overlaps with the first page
+            _page(comments[15:], 20, has_more=0),
+        ],
+    )
+    assert [c.id for c in get_comments(url)] == [c["cid"] for c in comments]
+    assert [r.qs["cursor"] for r in mock.request_history] == [["0"], ["10"], ["15"]]
+
+
+def test_pagination_stops_at_max_comments(requestsm):
+    url = "https://www.tiktok.com/@fanmallorcashopping/video/7385245034506964257"
+    comments = json.loads(SUCCESS_RESPONSE)["comments"]
+    mock = requestsm.get(
+        "https://api.lamatok.com/v1/media/comments/by/id",
+        [_page(comments[i : i + 5], i + 5) for i in range(0, 20, 5)],
+    )
+    result = get_comments(url, max_comments=3)
+    assert len({c.username for c in result}) == 3
+    assert mock.call_count == 1  # The page is enough, the next isn't prefetched
+
+    result = get_comments(url, max_comments=8)
+    assert len({c.username for c in result}) == 8
+    assert mock.call_count == 3  # Two more pages
+
+
+def test_pagination_past_the_last_comment(requestsm):
+    url = "https://www.tiktok.com/@fanmallorcashopping/video/7385245034506964257"
+    requestsm.get(
+        "https://api.lamatok.com/v1/media/comments/by/id",
+        [
+            _page(json.loads(SUCCESS_RESPONSE)["comments"], 20),
+            {
+                "status_code": 404,
+                "text": '{"detail":"Comments (or media) Not found","exc_type":"CommentsNotFoundError","tt_status_code":0}',
+            },
+        ],
+    )
+    assert len(get_comments(url)) == 20
+
+
+def test_short_url_resolution(requestsm):
+    requestsm.get(
+        "https://vm.tiktok.com/ZMrjQ8U3W/",
+        status_code=301,
+        headers={"Location": "/t/ZMrjQ8U3W/"},
+    )
+    requestsm.get(
+        "https://vm.tiktok.com/t/ZMrjQ8U3W/",
+        status_code=302,
+        headers={
+            "Location": "https://www.tiktok.com/@fanmallorcashopping/video/7385245034506964257?lang=es"
+        },
+    )
+    comments = requestsm.get(
+        "https://api.lamatok.com/v1/media/comments/by/id",
+        json={**json.loads(SUCCESS_RESPONSE), "has_more": 0},
+    )
+    assert len(get_comments("https://vm.tiktok.com/ZMrjQ8U3W/")) == 20
+    assert get_comments("https://vm.tiktok.com/ZMrjQ8U3W/", min_mentions=1)
+    assert comments.last_request.qs["id"] == ["7385245034506964257"]
+    short_url_requests = [
+        r for r in requestsm.request_history if r.hostname == "vm.tiktok.com"
+    ]
+    assert len(short_url_requests) == 2  # Resolved once
+    assert all(r.timeout for r in short_url_requests)
+
+
+def test_short_url_redirect_loop(requestsm):
+    url = "https://vm.tiktok.com/ZMrjQ8U3W/"
+    mock = requestsm.get(url, status_code=302, headers={"Location": url})
+    with pytest.raises(InvalidURL):
+        get_comments(url)
+    assert mock.call_count == tiktok.MAX_REDIRECTS
+
+
+def test_circuit_opens_on_failing_upstream(requestsm):
+    url = "https://www.tiktok.com/@fanmallorcashopping/video/7385245034506964257"
+    mock = requestsm.get(
+        "https://api.lamatok.com/v1/media/comments/by/id", status_code=502
+    )
+    for _ in range(circuit_breaker.CircuitBreaker.FAILURE_THRESHOLD):
+        with pytest.raises(requests.exceptions.HTTPError):
+            get_comments(url)
+    with pytest.raises(circuit_breaker.CircuitOpenError):
+        get_comments(url)
+    assert mock.call_count == circuit_breaker.CircuitBreaker.FAILURE_THRESHOLD
+
+
+def test_circuit_opens_on_slow_upstream(requestsm):
+    url = "https://www.tiktok.com/@fanmallorcashopping/video/7385245034506964257"
+    requestsm.get(
+        "https://api.lamatok.com/v1/media/comments/by/id",
+        exc=requests.exceptions.ReadTimeout,
+    )
+    for _ in range(circuit_breaker.CircuitBreaker.FAILURE_THRESHOLD):
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            get_comments(url)
+    assert tiktok.lamatok.BREAKER.is_open()
@@ -37,6 +37,23 @@ class TestBackup(APILiveServerTestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
 
+    def test_redeem_invalidates_cached_draw(self):
+        draw_url = reverse("letter-detail", kwargs=dict(pk=self.draw.id))
+        assert self.client.get(draw_url).data["payments"] == []
+        self.client.post(self.url, {"draw_id": self.draw.id, "code": self.code})
+        assert set(self.client.get(draw_url).data["payments"]) == set(
+            ["CERTIFIED", "ADFREE", "SUPPORT"]
+        )
+
+    def test_redeem_changes_the_draw_version(self):
+        draw_url = reverse("letter-detail", kwargs=dict(pk=self.draw.id))
+        etag = self.client.get(draw_url)["ETag"]
+        self.client.post(self.url, {"draw_id": self.draw.id, "code": self.code})
+        response = self.client.get(draw_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn("CERTIFIED", response.data["payments"])
+
     def test_unknown_code_fails(self):
         response = self.client.post(
             self.url, {"draw_id": self.draw.id, "code": "AAAAAAAA"}
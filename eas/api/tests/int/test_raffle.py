@@ -1,11 +1,14 @@
+import csv
 import datetime as dt
+import json
 import time
+from unittest import mock
 
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APILiveServerTestCase
 
-from eas.api.models import Raffle
+from eas.api.models import Participant, Raffle
 
 from ..factories import RaffleFactory
 from .common import DrawAPITestMixin
@@ -173,3 +176,169 @@ class TestRaffle(DrawAPITestMixin, APILiveServerTestCase):
 
         draw = self.get_draw(draw.id)
         assert draw.updated_at > initial_last_updated
+
+    def test_create_with_repeated_facebook_ids(self):
+        response = self.success_create(
+            participants=[
+                {"name": "ramon", "facebook_id": "1"},
+                {"name": "ramon again", "facebook_id": "1"},
+                {"name": "paco"},
+            ]
+        )
+        names = [p["name"] for p in response.json()["participants"]]
+        assert names == ["ramon", "paco"]
+
+    def _bulk_add(self, draw, data, content_type="application/json", pk=None):
+        url = reverse(
+            f"{self.base_url}-participants-bulk",
+            kwargs=dict(pk=pk or draw.private_id),
+        )
+        return self.client.post(url, data, content_type=content_type)
+
+    def test_bulk_add_participants(self):
+        draw = self.Factory(participants=[])
+        Participant.objects.create(draw=draw, name="ramon", facebook_id="1")
+
+        response = self._bulk_add(
+            draw,
+            json.dumps(
+                [
+                    {"name": "ramon again", "facebook_id": "1"},
+                    {"name": "paco"},
+                    {"name": "paco"},
+                    {"name": "maria", "facebook_id": "2"},
+                    {"name": "maria again", "facebook_id": "2"},
+                ]
+            ),
+        )
+
+        self.assertEqual(
+            response.status_code, status.HTTP_201_CREATED, response.content
+        )
+        self.assertEqual(response.json(), {"created": 3})
+        names = [p.name for p in self.get_draw(draw.id).participants]
+        assert names == ["ramon", "paco", "paco", "maria"]
+
+    def test_bulk_add_participants_csv(self):
+        draw = self.Factory(participants=[])
+
+        response = self._bulk_add(
+            draw,
+            "name,facebook_id\r\npaco,\r\nmaría,2\r\nmaria,2\r\n",
+            content_type="text/csv",
+        )
+
+        self.assertEqual(
+            response.status_code, status.HTTP_201_CREATED, response.content
+        )
+        participants = self.get_draw(draw.id).participants
+        assert [(p.name, p.facebook_id) for p in participants] == [
+            ("paco", None),
+            ("maría", "2"),
+        ]
+
+    def test_bulk_add_participants_ndjson(self):
+        draw = self.Factory(participants=[])
+
+        response = self._bulk_add(
+            draw,
+            '{"name": "paco"}\n\n{"name": "maria", "facebook_id": "2"}\n',
+            content_type="application/x-ndjson",
+        )
+
+        self.assertEqual(
+            response.status_code, status.HTTP_201_CREATED, response.content
+        )
+        participants = self.get_draw(draw.id).participants
+        assert [(p.name, p.facebook_id) for p in participants] == [
+            ("paco", None),
+            ("maria", "2"),
+        ]
+
+    def test_bulk_add_participants_in_batches(self):
+        draw = self.Factory(participants=[])
+        data = "".join(f'{{"name": "participant {i}"}}\n' for i in range(25))
+
+        with mock.patch.object(Raffle, "BULK_CREATE_BATCH_SIZE", 10):
+            with mock.patch(
+                "eas.api.views.ParticipantsMixin.BULK_VALIDATION_BATCH_SIZE", 7
+            ):
+                response = self._bulk_add(
+                    draw, data, content_type="application/x-ndjson"
+                )
+
+        self.assertEqual(
+            response.status_code, status.HTTP_201_CREATED, response.content
+        )
+        self.assertEqual(response.json(), {"created": 25})
+        participants = self.get_draw(draw.id).participants
+        assert [p.name for p in participants] == [f"participant {i}" for i in range(25)]
+
+    def test_bulk_add_invalid_participant_adds_none(self):
+        draw = self.Factory(participants=[])
+
+        with mock.patch(
+            "eas.api.views.ParticipantsMixin.BULK_VALIDATION_BATCH_SIZE", 2
+        ):
+            response = self._bulk_add(
+                draw,
+                json.dumps([{"name": "paco"}, {"name": "pepe"}, {"name": "juan"}, {}]),
+            )
+
+        self.assertEqual(
+            response.status_code, status.HTTP_400_BAD_REQUEST, response.content
+        )
+        assert list(response.json()["schema"]) == ["3"]
+        assert not self.get_draw(draw.id).participants
+
+    def test_bulk_add_participants_requires_a_list(self):
+        draw = self.Factory(participants=[])
+
+        for body in ({"name": "paco"}, "paco", 5, True, None):
+            with self.subTest(body=body):
+                response = self._bulk_add(draw, json.dumps(body))
+                self.assertEqual(
+                    response.status_code, status.HTTP_400_BAD_REQUEST, response.content
+                )
+
+    def test_bulk_add_participants_requires_the_private_id(self):
+        draw = self.Factory(participants=[])
+
+        response = self._bulk_add(draw, json.dumps([{"name": "paco"}]), pk=draw.id)
+
+        self.assertEqual(
+            response.status_code, status.HTTP_403_FORBIDDEN, response.content
+        )
+        assert not self.get_draw(draw.id).participants
+
+    def test_bulk_add_too_many_participants_adds_none(self):
+        draw = self.Factory(participants=[])
+        data = "".join(f'{{"name": "participant {i}"}}\n' for i in range(6))
+
+        with mock.patch("eas.api.views.ParticipantsMixin.BULK_MAX_PARTICIPANTS", 5):
+            with mock.patch(
+                "eas.api.views.ParticipantsMixin.BULK_VALIDATION_BATCH_SIZE", 2
+            ):
+                response = self._bulk_add(
+                    draw, data, content_type="application/x-ndjson"
+                )
+
+        self.assertEqual(
+            response.status_code, status.HTTP_400_BAD_REQUEST, response.content
+        )
+        assert not self.get_draw(draw.id).participants
+
+    def test_bulk_add_participants_malformed_body(self):
+        draw = self.Factory(participants=[])
+        for content_type, data in [
+            ("application/x-ndjson", '{"name": "paco"}\n{"name": \n'),
+            ("text/csv", "name\n" + "a" * (csv.field_size_limit() + 1)),
+            ("text/csv", b"name\n\xff\n"),
+        ]:
+            with self.subTest(content_type=content_type, data=data):
+                response = self._bulk_add(draw, data, content_type=content_type)
+
+                self.assertEqual(
+                    response.status_code, status.HTTP_400_BAD_REQUEST, response.content
+                )
+                assert not self.get_draw(draw.id).participants
@@ -0,0 +1,101 @@
+import datetime as dt
+from unittest import mock
+
+import freezegun
+from django.test import TestCase
+
+from eas.api import models
+from eas.api.management.commands import resolve_scheduled
+
+from .. import factories
+
+NOW = dt.datetime.now(dt.timezone.utc)
+PAST = NOW - dt.timedelta(hours=1)
+FUTURE = NOW + dt.timedelta(hours=1)
+
+
+class TestResolveScheduled(TestCase):
+    def test_resolves_only_due_results(self):
+        draw = factories.CoinFactory()
+        due = draw.schedule_toss(PAST)
+        pending = draw.schedule_toss(FUTURE)
+        updated_at = models.Coin.objects.get(id=draw.id).updated_at
+
+        assert resolve_scheduled.resolve_due_results() == 1
+
+        due.refresh_from_db()
+        pending.refresh_from_db()
+        assert due.value is not None
+        assert pending.value is None
+        assert models.Coin.objects.get(id=draw.id).updated_at > updated_at
+        assert resolve_scheduled.resolve_due_results() == 0
+
+    def test_resolves_draws_of_all_types(self):
+        draws = [factories.RaffleFactory(), factories.LetterFactory()]
+        for draw in draws:
+            draw.schedule_toss(PAST)
+            draw.schedule_toss(PAST)
+
+        assert resolve_scheduled.resolve_due_results() == 4
+        assert not models.Result.objects.filter(value__isnull=True).exists()
+
+    def test_batch_size(self):
+        for _ in range(3):
+            factories.SpinnerFactory().schedule_toss(PAST)
+
+        assert resolve_scheduled.resolve_due_results(batch_size=2) == 2
+        assert resolve_scheduled.resolve_due_results(batch_size=2) == 1
+
+    def test_draw_not_ready_is_skipped(self):
+        not_ready = factories.RaffleFactory(participants=[])
+        not_ready.schedule_toss(PAST - dt.timedelta(hours=1))
+        ready = factories.RaffleFactory()
+        ready.schedule_toss(PAST)
+
+        assert resolve_scheduled.resolve_due_results() == 1
+        assert not_ready.results.get().value is None
+        assert ready.results.get().value is not None
+
+    def test_failing_draw_is_skipped(self):
+        factories.CoinFactory().schedule_toss(PAST)
+        with mock.patch.object(
+            models.Coin, "generate_result", side_effect=RuntimeError
+        ):
+            assert resolve_scheduled.resolve_due_results() == 0
+        assert models.Result.objects.get().value is None
+
+    def test_failing_draws_back_off(self):
+        failing = factories.RaffleFactory(participants=[])
+        failing.schedule_toss(PAST)
+        healthy = factories.CoinFactory()
+        healthy.schedule_toss(PAST - dt.timedelta(hours=1))
+
+        with freezegun.freeze_time(NOW) as frozen_time:
+            assert resolve_scheduled.resolve_due_results(batch_size=1) == 0
+            result = failing.results.get()
+            assert result.resolve_attempts == 1
+            assert result.resolve_after == NOW + dt.timedelta(minutes=1)
+            # The failing draw no longer takes the slot of the healthy one
+            assert resolve_scheduled.resolve_due_results(batch_size=1) == 1
+            assert healthy.results.get().value is not None
+
+            for attempt in range(2, resolve_scheduled.MAX_ATTEMPTS + 1):
+                frozen_time.tick(resolve_scheduled.MAX_RETRY_DELAY)
+                assert resolve_scheduled.resolve_due_results() == 0
+                assert failing.results.get().resolve_attempts == attempt
+            frozen_time.tick(resolve_scheduled.MAX_RETRY_DELAY)
+            with mock.patch.object(models.Raffle, "ready_to_toss_check") as check:
+                assert resolve_scheduled.resolve_due_results() == 0
+            check.assert_not_called()  # Given up
+
+    def test_resolved_results_are_not_overwritten(self):
+        draw = factories.CoinFactory()
+        result = draw.schedule_toss(PAST)
+        stale_results = mock.Mock()
+        stale_results.filter.return_value = list(draw.results.all())
+        assert draw.resolve_scheduled_results() == 1
+        value = models.Result.objects.get(id=result.id).value
+
+        with mock.patch.object(models.Coin, "results", stale_results):
+            assert draw.resolve_scheduled_results() == 0  # Lost the race
+        assert models.Result.objects.get(id=result.id).value == value
@@ -2,11 +2,14 @@ import datetime as dt
 from unittest import mock
 
 import freezegun
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APILiveServerTestCase
 
 from eas.api import models
+from eas.api.management.commands import send_outbox
 
 NOW = dt.datetime.now()
 
@@ -23,8 +26,9 @@ class SecretSantaTest(APILiveServerTestCase):
                 {"name": "Third Name", "phone_number": "+34123456789"},
             ],
         }
-        boto_patcher = mock.patch("eas.api.amazonsqs.boto3")
+        boto_patcher = mock.patch("eas.api.aws.boto3")
         self.sqs = boto_patcher.start().client.return_value
+        self.sqs.send_message_batch.return_value = {"Successful": [], "Failed": []}
         self.addCleanup(boto_patcher.stop)
 
     def test_create_secret_santa(self):
@@ -33,9 +37,30 @@ class SecretSantaTest(APILiveServerTestCase):
             response.status_code, status.HTTP_201_CREATED, response.content
         )
         assert response.json() == {"id": mock.ANY}
-        assert self.sqs.send_message.call_count == 1
-        assert "email@address1.com" in self.sqs.send_message.call_args[1]["MessageBody"]
-        assert "+34123456789" in self.sqs.send_message.call_args[1]["MessageBody"]
+        assert self.sqs.send_message_batch.call_count == 0
+        assert send_outbox.send_queued_messages() == 1
+        assert self.sqs.send_message_batch.call_count == 1
+        (entry,) = self.sqs.send_message_batch.call_args[1]["Entries"]
+        assert "email@address1.com" in entry["MessageBody"]
+        assert "+34123456789" in entry["MessageBody"]
+
+    def test_create_queries_do_not_grow_with_participants(self):
+        def create(count):
+            participants = [
+                {"name": f"name {i}", "email": f"email{i}@address.com"}
+                for i in range(count)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    self.list_url, {"language": "en", "participants": participants}
+                )
+            self.assertEqual(
+                response.status_code, status.HTTP_201_CREATED, response.content
+            )
+            return len(queries)
+
+        assert create(3) == create(100)
+        assert models.OutboxMessage.objects.count() == 2
 
     def test_create_with_exclusions(self):
         self.secret_santa_data = {
@@ -214,7 +239,7 @@ class SecretSantaTest(APILiveServerTestCase):
             source="From name", target="To Name", draw=draw
         )
         result.save()
-        assert self.sqs.send_message.call_count == 0
+        assert self.sqs.send_message_batch.call_count == 0
 
         url = reverse(
             "secret-santa-resend-email",
@@ -224,8 +249,9 @@ class SecretSantaTest(APILiveServerTestCase):
             response = self.client.post(
                 url, {"language": "en", "email": "mail@mail.com"}
             )
+            send_outbox.send_queued_messages()
         self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
-        assert self.sqs.send_message.call_count == 1
+        assert self.sqs.send_message_batch.call_count == 1
 
     def test_resend_whatsapp_success(self):
         draw = models.SecretSanta()
@@ -234,7 +260,7 @@ class SecretSantaTest(APILiveServerTestCase):
             source="From name", target="To Name", draw=draw
         )
         result.save()
-        assert self.sqs.send_message.call_count == 0
+        assert self.sqs.send_message_batch.call_count == 0
 
         url = reverse(
             "secret-santa-resend-email",
@@ -244,8 +270,9 @@ class SecretSantaTest(APILiveServerTestCase):
             response = self.client.post(
                 url, {"language": "en", "phone_number": "+34123456789"}
             )
+            send_outbox.send_queued_messages()
         self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
-        assert self.sqs.send_message.call_count == 1
+        assert self.sqs.send_message_batch.call_count == 1
 
     def test_resend_missing_target(self):
         draw = models.SecretSanta()
@@ -254,7 +281,7 @@ class SecretSantaTest(APILiveServerTestCase):
             source="From name", target="To Name", draw=draw
         )
         result.save()
-        assert self.sqs.send_message.call_count == 0
+        assert self.sqs.send_message_batch.call_count == 0
 
         url = reverse(
             "secret-santa-resend-email",
@@ -263,7 +290,9 @@ class SecretSantaTest(APILiveServerTestCase):
         with freezegun.freeze_time(NOW + dt.timedelta(days=1)):
             response = self.client.post(url, {"language": "en"})
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        assert self.sqs.send_message.call_count == 0
+        assert not models.OutboxMessage.objects.exists()
+        result.refresh_from_db()
+        assert result.valid
 
     def test_resend_email_unlinked_result_fails(self):
         draw = models.SecretSanta()
@@ -346,7 +375,7 @@ class SecretSantaTest(APILiveServerTestCase):
             source="From name", target="To Name", draw=draw
         )
         result.save()
-        assert self.sqs.send_message.call_count == 0
+        assert self.sqs.send_message_batch.call_count == 0
 
         url = reverse(
             "secret-santa-resend-email",
@@ -355,7 +384,8 @@ class SecretSantaTest(APILiveServerTestCase):
         with freezegun.freeze_time(NOW + dt.timedelta(days=1)):
             response = self.client.post(url, new_email_data)
             self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
-            assert self.sqs.send_message.call_count == 1
+            send_outbox.send_queued_messages()
+            assert self.sqs.send_message_batch.call_count == 1
             new_result_id = response.json()["new_result"]
 
             # Send email on same result is invalid
@@ -0,0 +1,196 @@
+import datetime as dt
+import json
+from unittest import mock
+
+import freezegun
+from django.test import TestCase
+
+from eas.api import amazonsqs, models
+from eas.api.management.commands import send_outbox
+
+NOW = dt.datetime.now(dt.timezone.utc)
+
+
+def _failure(entry_id, sender_fault=False):
+    return {"Id": entry_id, "SenderFault": sender_fault, "Code": "InternalError"}
+
+
+class TestSendOutbox(TestCase):
+    def setUp(self):
+        boto_patcher = mock.patch("eas.api.aws.boto3")
+        self.sqs = boto_patcher.start().client.return_value
+        self.sqs.send_message_batch.return_value = {"Successful": [], "Failed": []}
+        self.addCleanup(boto_patcher.stop)
+
+    def sent_bodies(self):
+        return [
+            entry["MessageBody"]
+            for call in self.sqs.send_message_batch.call_args_list
+            for entry in call[1]["Entries"]
+        ]
+
+    def test_sends_and_deletes_queued_messages(self):
+        amazonsqs.queue_secret_santa_message({"lang": "en", "mails": [["a@a.com", 1]]})
+        amazonsqs.queue_secret_santa_message({"lang": "es", "mails": [["b@b.com", 2]]})
+
+        assert send_outbox.send_queued_messages() == 2
+
+        assert self.sqs.send_message_batch.call_count == 1
+        assert self.sent_bodies() == [
+            '{"lang": "en", "mails": [["a@a.com", 1]]}',
+            '{"lang": "es", "mails": [["b@b.com", 2]]}',
+        ]
+        assert not models.OutboxMessage.objects.exists()
+        assert send_outbox.send_queued_messages() == 0
+
+    def test_sends_in_batches(self):
+        for _ in range(3):
+            amazonsqs.queue_secret_santa_message({})
+
+        assert send_outbox.send_queued_messages(batch_size=2) == 2
+        assert send_outbox.send_queued_messages(batch_size=2) == 1
+
+    def test_failed_messages_are_retried_with_backoff(self):
+        self.sqs.send_message_batch.side_effect = [
+            Exception("SQS down"),
+            Exception(),
+            {"Successful": [], "Failed": []},
+        ]
+        with freezegun.freeze_time(NOW):
+            message = amazonsqs.queue_secret_santa_message({"lang": "en"})
+            assert send_outbox.send_queued_messages() == 0
+
+        message.refresh_from_db()
+        assert message.attempts == 1
+        assert message.available_at == NOW + dt.timedelta(seconds=2)
+
+        with freezegun.freeze_time(NOW + dt.timedelta(seconds=1)):
+            assert send_outbox.send_queued_messages() == 0
+            assert self.sqs.send_message_batch.call_count == 1
+        with freezegun.freeze_time(NOW + dt.timedelta(seconds=2)):
+            assert send_outbox.send_queued_messages() == 0
+        message.refresh_from_db()
+        assert message.attempts == 2
+        assert message.available_at == NOW + dt.timedelta(seconds=6)
+
+        with freezegun.freeze_time(NOW + dt.timedelta(seconds=6)):
+            assert send_outbox.send_queued_messages() == 1
+        assert not models.OutboxMessage.objects.exists()
+
+    def test_only_failed_entries_are_kept(self):
+        ok = amazonsqs.queue_secret_santa_message({"n": 1})
+        failed = amazonsqs.queue_secret_santa_message({"n": 2})
+        rejected = amazonsqs.queue_secret_santa_message({"n": 3})
+        self.sqs.send_message_batch.return_value = {
+            "Successful": [{"Id": ok.id}],
+            "Failed": [_failure(failed.id), _failure(rejected.id, sender_fault=True)],
+        }
+
+        with self.assertLogs(send_outbox.LOG, "ERROR") as logs:
+            assert send_outbox.send_queued_messages() == 1
+
+        assert list(models.OutboxMessage.objects.values_list("id", "attempts")) == [
+            (failed.id, 1)
+        ]
+        assert rejected.id in logs.output[0]
+
+    def test_messages_are_dropped_after_max_attempts(self):
+        self.sqs.send_message_batch.side_effect = Exception("SQS down")
+        message = amazonsqs.queue_secret_santa_message({"lang": "en"})
+        models.OutboxMessage.objects.filter(id=message.id).update(
+            attempts=send_outbox.MAX_ATTEMPTS - 1
+        )
+
+        with self.assertLogs(send_outbox.LOG, "ERROR") as logs:
+            assert send_outbox.send_queued_messages() == 0
+
+        assert not models.OutboxMessage.objects.exists()
+        assert message.id in logs.output[0]
+
+    def test_retry_delay_is_capped(self):
+        self.sqs.send_message_batch.side_effect = Exception("SQS down")
+        with freezegun.freeze_time(NOW):
+            message = amazonsqs.queue_secret_santa_message({"lang": "en"})
+            models.OutboxMessage.objects.filter(id=message.id).update(attempts=10)
+            assert send_outbox.send_queued_messages() == 0
+
+        message.refresh_from_db()
+        assert message.attempts == 11
+        assert message.available_at == NOW + dt.timedelta(
+            seconds=send_outbox.MAX_RETRY_DELAY
+        )
+
+
+class TestBatchPublisher(TestCase):
+    def setUp(self):
+        boto_patcher = mock.patch("eas.api.aws.boto3")
+        self.sqs = boto_patcher.start().client.return_value
+        self.sqs.send_message_batch.return_value = {"Successful": [], "Failed": []}
+        self.addCleanup(boto_patcher.stop)
+
+    def batches(self):
+        return [
+            [entry["Id"] for entry in call[1]["Entries"]]
+            for call in self.sqs.send_message_batch.call_args_list
+        ]
+
+    def test_batches_are_limited_in_entries(self):
+        publisher = amazonsqs.BatchPublisher()
+        for i in range(23):
+            publisher.publish(str(i), {})
+        assert len(self.batches()) == 2
+        publisher.flush()
+        publisher.flush()  # Nothing left to send
+        assert [len(batch) for batch in self.batches()] == [10, 10, 3]
+
+    def test_batches_are_limited_in_size(self):
+        publisher = amazonsqs.BatchPublisher()
+        big_message = "x" * (amazonsqs.MAX_BATCH_BYTES // 3)
+        for i in range(4):
+            publisher.publish(str(i), big_message)
+        publisher.flush()
+        assert self.batches() == [["0", "1"], ["2", "3"]]
+        for call in self.sqs.send_message_batch.call_args_list:
+            entries = call[1]["Entries"]
+            size = sum(len(e["MessageBody"].encode()) for e in entries)
+            assert size <= amazonsqs.MAX_BATCH_BYTES
+
+    def test_batch_is_sent_after_max_delay(self):
+        publisher = amazonsqs.BatchPublisher(max_delay=5)
+        with freezegun.freeze_time(NOW) as frozen:
+            publisher.publish("1", {})
+            frozen.tick(4)
+            publisher.publish("2", {})
+            assert not self.batches()
+            frozen.tick(1)
+            publisher.publish("3", {})
+        assert self.batches() == [["1", "2", "3"]]
+
+    def test_only_failed_entries_are_retried(self):
+        self.sqs.send_message_batch.side_effect = [
+            {"Failed": [_failure("1"), _failure("2", sender_fault=True)]},
+            {"Failed": [_failure("1")]},
+            {"Failed": []},
+        ]
+        publisher = amazonsqs.BatchPublisher()
+        for i in range(3):
+            publisher.publish(str(i), {"n": i})
+        publisher.flush()
+
+        assert self.batches() == [["0", "1", "2"], ["1"], ["1"]]
+        assert publisher.failed == {"2": "InternalError"}
+        assert publisher.rejected == {"2"}
+        assert json.loads(
+            self.sqs.send_message_batch.call_args[1]["Entries"][0]["MessageBody"]
+        ) == {"n": 1}
+
+    def test_entries_failing_every_retry_are_reported(self):
+        self.sqs.send_message_batch.return_value = {
+            "Failed": [dict(_failure("1"), Message="Try later")]
+        }
+        publisher = amazonsqs.BatchPublisher(retries=1)
+        publisher.publish("1", {})
+        publisher.flush()
+
+        assert self.batches() == [["1"], ["1"]]
+        assert publisher.failed == {"1": "Try later"}
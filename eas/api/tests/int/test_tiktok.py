@@ -1,3 +1,4 @@
+import datetime as dt
 import json
 import pathlib
 from unittest.mock import ANY, patch
@@ -8,7 +9,8 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APILiveServerTestCase
 
-from eas.api import models, tiktok
+from eas.api import circuit_breaker, models, tiktok
+from eas.api.management.commands import resolve_scheduled
 from eas.api.tests.int.common import DrawAPITestMixin
 from eas.api.tests.int.test_purge import PurgeMixin
 
@@ -31,7 +33,9 @@ def lamatok_fake():
     ).resolve().open() as f:
         lamatok_response = json.load(f)["comments"]
         with patch("eas.api.tiktok.lamatok") as lamatok_mock:
-            lamatok_mock.fetch_comments.return_value = lamatok_response
+            lamatok_mock.iter_comments.side_effect = lambda _, wanted: iter(
+                lamatok_response
+            )
             yield lamatok_mock
 
 
@@ -76,6 +80,7 @@ class Testtiktok(DrawAPITestMixin, APILiveServerTestCase):
                 },
             }
         ]
+        tiktok_fake.assert_called_once()  # Not fetched again to check
 
     @patch("eas.api.tiktok.get_comments")
     def test_invalid_post_has_no_comments(self, tiktok_fake):
@@ -115,6 +120,36 @@ class Testtiktok(DrawAPITestMixin, APILiveServerTestCase):
             response.content,
         )
 
+    @patch("eas.api.tiktok.get_comments")
+    def test_timeout_on_past_schedule_is_left_to_the_scheduler(self, tiktok_fake):
+        tiktok_fake.side_effect = requests.exceptions.ConnectionError
+        draw = self.Factory(prizes=[{"name": "cupcake"}], min_mentions=0)
+        url = reverse(f"{self.base_url}-toss", kwargs=dict(pk=draw.private_id))
+        schedule_date = dt.datetime.now(dt.timezone.utc) - dt.timedelta(minutes=1)
+        response = self.client.post(url, {"schedule_date": schedule_date})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertIsNone(response.data["value"])
+        self.assertIsNone(draw.results.get().value)
+
+        tiktok_fake.side_effect = None
+        tiktok_fake.return_value = [COMMENT]
+        resolve_scheduled.resolve_due_results()
+        self.assertIsNotNone(draw.results.get().value)
+
+    @patch("eas.api.tiktok.get_comments")
+    def test_toss_with_open_circuit(self, tiktok_fake):
+        tiktok_fake.side_effect = circuit_breaker.CircuitOpenError
+        draw = self.Factory(prizes=[{"name": "cupcake"}], min_mentions=0)
+        url = reverse(f"{self.base_url}-toss", kwargs=dict(pk=draw.private_id))
+        response = self.client.post(url, {})
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_500_INTERNAL_SERVER_ERROR,
+            response.content,
+        )
+        self.assertIn("Not available right now", response.data["detail"])
+        self.assertFalse(models.Tiktok.objects.get(pk=draw.pk).results.exists())
+
     def test_success_result_with_mentions(self):
         draw = self.Factory(
             prizes=[{"name": "cupcake"}],
@@ -23,7 +23,7 @@ def create_stripe_list_mock(data_list):
 class AuthenticationTest(TestCase):
     """Test user authentication with magic links"""
 
-    @patch("eas.api.email.boto3.client")
+    @patch("eas.api.aws.boto3.client")
     def test_request_magic_link_existing_user(self, mock_boto_client):
         """Test requesting magic link for existing user"""
         # Mock SES client
@@ -48,7 +48,7 @@ class AuthenticationTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTrue(models.LoginToken.objects.filter(user=user).exists())
 
-    @patch("eas.api.email.boto3.client")
+    @patch("eas.api.aws.boto3.client")
     def test_request_magic_link_nonexistent_user(self, mock_boto_client):
         """Test requesting magic link for non-existent user creates the user"""
         # Mock SES client
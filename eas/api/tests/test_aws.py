@@ -0,0 +1,51 @@
+import threading
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from eas.api import aws
+
+
+@mock.patch("eas.api.aws.boto3.client", side_effect=lambda *args, **kwargs: mock.Mock())
+class TestClients(TestCase):
+    def test_client_is_reused(self, boto_client):
+        assert aws.client("sqs") is aws.client("sqs")
+        assert aws.client("ses") is not aws.client("sqs")
+        assert [c.args for c in boto_client.call_args_list] == [("sqs",), ("ses",)]
+
+    def test_client_is_configured(self, boto_client):
+        with override_settings(
+            AWS_MAX_POOL_CONNECTIONS=42, AWS_CONNECT_TIMEOUT=1, AWS_READ_TIMEOUT=2
+        ):
+            aws.client("sqs")
+        config = boto_client.call_args.kwargs["config"]
+        assert config.max_pool_connections == 42
+        assert config.connect_timeout == 1
+        assert config.read_timeout == 2
+
+    def test_settings_change_drops_clients(self, boto_client):
+        client = aws.client("sqs")
+        with override_settings(AWS_ENDPOINT_URL="http://localhost:4566"):
+            assert aws.client("sqs") is not client
+            assert boto_client.call_args.kwargs["endpoint_url"] == (
+                "http://localhost:4566"
+            )
+        with override_settings(DEBUG=True):
+            assert aws.client("sqs") is aws.client("sqs")
+
+    def test_concurrent_first_use_creates_one_client(self, boto_client):
+        barrier = threading.Barrier(8)
+        clients = []
+
+        def get_client():
+            barrier.wait()
+            clients.append(aws.client("sqs"))
+
+        threads = [threading.Thread(target=get_client) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert boto_client.call_count == 1
+        assert len(set(map(id, clients))) == 1
@@ -0,0 +1,111 @@
+from unittest import TestCase, mock
+
+import freezegun
+import pytest
+import requests
+import requests_mock
+from django.core.cache import caches
+
+from eas.api.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+URL = "https://upstream.example/comments"
+
+
+class TestCircuitBreaker(TestCase):
+    def setUp(self):
+        caches["social"].clear()
+        self.addCleanup(caches["social"].clear)
+        self.breaker = CircuitBreaker("upstream")
+        self.session = requests.Session()
+        self.upstream = requests_mock.Mocker()
+        self.upstream.start()
+        self.addCleanup(self.upstream.stop)
+
+    def record_failures(self, times=CircuitBreaker.FAILURE_THRESHOLD):
+        self.upstream.get(URL, status_code=500)
+        for _ in range(times):
+            self.breaker.get(self.session, URL)
+
+    def test_opens_after_failures(self):
+        self.record_failures(CircuitBreaker.FAILURE_THRESHOLD - 1)
+        assert not self.breaker.is_open()
+        self.record_failures(1)
+        assert self.breaker.is_open()
+        with pytest.raises(CircuitOpenError):
+            self.breaker.get(self.session, URL)
+        assert self.upstream.call_count == CircuitBreaker.FAILURE_THRESHOLD
+
+    def test_timeouts_are_failures(self):
+        self.upstream.get(URL, exc=requests.exceptions.ReadTimeout)
+        for _ in range(CircuitBreaker.FAILURE_THRESHOLD):
+            with pytest.raises(requests.exceptions.ReadTimeout):
+                self.breaker.get(self.session, URL)
+        assert self.breaker.is_open()
+
+    def test_client_errors_are_not_failures(self):
+        self.upstream.get(URL, status_code=404)
+        for _ in range(CircuitBreaker.FAILURE_THRESHOLD):
+            assert self.breaker.get(self.session, URL).status_code == 404
+        assert not self.breaker.is_open()
+
+    def test_failures_expire(self):
+        with freezegun.freeze_time() as frozen_time:
+            self.record_failures(CircuitBreaker.FAILURE_THRESHOLD - 1)
+            frozen_time.tick(CircuitBreaker.FAILURE_WINDOW + 1)
+            self.record_failures(1)
+        assert not self.breaker.is_open()
+
+    def test_failures_expire_while_counting(self):
+        with mock.patch.object(caches["social"], "incr", side_effect=ValueError):
+            self.record_failures(CircuitBreaker.FAILURE_THRESHOLD)
+        assert not self.breaker.is_open()
+
+    def test_state_is_shared(self):
+        self.record_failures()
+        with pytest.raises(CircuitOpenError):
+            CircuitBreaker("upstream").get(self.session, URL)
+        self.upstream.get(URL, status_code=200)
+        CircuitBreaker("other").get(self.session, URL)
+
+    def test_half_open_probe_closes(self):
+        with freezegun.freeze_time() as frozen_time:
+            self.record_failures()
+            frozen_time.tick(CircuitBreaker.RESET_TIMEOUT)
+            self.upstream.get(URL, status_code=200)
+            assert self.breaker.get(self.session, URL).status_code == 200
+        assert not self.breaker.is_open()
+        self.breaker.get(self.session, URL)
+
+    def test_half_open_probe_fails(self):
+        with freezegun.freeze_time() as frozen_time:
+            self.record_failures()
+            frozen_time.tick(CircuitBreaker.RESET_TIMEOUT)
+            self.record_failures(1)
+            with pytest.raises(CircuitOpenError):
+                self.breaker.get(self.session, URL)
+            frozen_time.tick(CircuitBreaker.RESET_TIMEOUT)
+            self.record_failures(1)  # A new probe
+        assert self.upstream.call_count == CircuitBreaker.FAILURE_THRESHOLD + 2
+
+    def test_single_probe_while_half_open(self):
+        with freezegun.freeze_time() as frozen_time:
+            self.record_failures()
+            frozen_time.tick(CircuitBreaker.RESET_TIMEOUT)
+            caches["social"].add("circuit:upstream:probe", True)  # In flight
+            with pytest.raises(CircuitOpenError):
+                self.breaker.get(self.session, URL)
+
+    def test_adaptive_timeout(self):
+        self.upstream.get(URL, status_code=200)
+        self.breaker.get(self.session, URL)
+        assert self.upstream.last_request.timeout == CircuitBreaker.MAX_TIMEOUT
+        for _ in range(CircuitBreaker.MIN_LATENCY_SAMPLES):
+            self.breaker.get(self.session, URL)
+        assert self.upstream.last_request.timeout == CircuitBreaker.MIN_TIMEOUT
+
+    def test_timeout_from_latency_percentile(self):
+        # pylint: disable=protected-access
+        self.breaker._latencies.extend([1] * 98 + [20, 30])
+        assert self.breaker.timeout() == pytest.approx(20.1 * 3)
+        self.breaker._latencies.extend([100] * 10)
+        assert self.breaker.timeout() == CircuitBreaker.MAX_TIMEOUT
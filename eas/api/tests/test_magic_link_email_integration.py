@@ -18,7 +18,7 @@ class MagicLinkEmailIntegrationTest(TestCase):
         self.test_email = "test@example.com"
         self.return_url = "https://example.com/success"
 
-    @patch("eas.api.email.boto3.client")
+    @patch("eas.api.aws.boto3.client")
     def test_magic_link_request_sends_email(self, mock_boto_client):
         """Test that requesting magic link sends email via SES"""
         # Mock SES client response
@@ -62,7 +62,7 @@ class MagicLinkEmailIntegrationTest(TestCase):
         self.assertIn(token.token, html_body)
         self.assertIn(token.token, text_body)
 
-    @patch("eas.api.email.boto3.client")
+    @patch("eas.api.aws.boto3.client")
     def test_magic_link_request_email_failure(self, mock_boto_client):
         """Test handling of email sending failure"""
         # Mock SES client to fail
@@ -88,7 +88,7 @@ class MagicLinkEmailIntegrationTest(TestCase):
         token = models.LoginToken.objects.get(user=user)
         self.assertEqual(token.return_url, self.return_url)
 
-    @patch("eas.api.email.boto3.client")
+    @patch("eas.api.aws.boto3.client")
     def test_existing_user_magic_link(self, mock_boto_client):
         """Test magic link for existing user"""
         # Mock SES client response
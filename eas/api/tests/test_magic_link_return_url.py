@@ -35,7 +35,7 @@ class MagicLinkReturnUrlTest(TestCase):
         # Check no user was created
         self.assertFalse(User.objects.filter(email=self.test_email).exists())
 
-    @patch("eas.api.email.boto3.client")
+    @patch("eas.api.aws.boto3.client")
     def test_request_magic_link_with_return_url(self, mock_boto_client):
         """Test requesting magic link with return URL"""
         # Mock SES client
@@ -96,7 +96,7 @@ class MagicLinkReturnUrlTest(TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.json()["error"], "Email is required")
 
-    @patch("eas.api.email.boto3.client")
+    @patch("eas.api.aws.boto3.client")
     def test_existing_user_with_return_url(self, mock_boto_client):
         """Test requesting magic link for existing user with return URL"""
         # Mock SES client
@@ -1,8 +1,24 @@
-from django.test import TestCase
+import datetime as dt
+import threading
+import time
+from unittest import mock
 
-from eas.api.models import RandomNumber, created_discount_code
+import freezegun
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
 
-from .factories import RandomNumberFactory
+from eas.api import instagram, models
+from eas.api.models import Coin, RandomNumber, created_discount_code
+
+from .factories import (
+    CoinFactory,
+    InstagramFactory,
+    LetterFactory,
+    LotteryFactory,
+    RandomNumberFactory,
+)
 
 
 class TestModels(TestCase):
@@ -35,12 +51,298 @@ class TestModels(TestCase):
         self.assertEqual(self.draw.results.count(), 50)
         self.assertNotIn(res1, self.draw.results.all())
 
+    def test_has_unresolved_results(self):
+        now = dt.datetime.now(dt.timezone.utc)
+        self.draw.schedule_toss(now + dt.timedelta(hours=1))
+        self.draw.toss()
+        self.assertFalse(self.draw.has_unresolved_results())
+        self.draw.schedule_toss(now - dt.timedelta(hours=1))
+        self.assertTrue(self.draw.has_unresolved_results())
+        self.draw.resolve_scheduled_results()
+        self.assertFalse(self.draw.has_unresolved_results())
+
+    def test_has_unresolved_results_single_query(self):
+        for _ in range(RandomNumber.RESULTS_LIMIT):
+            self.draw.toss()
+        with self.assertNumQueries(1):
+            self.assertFalse(self.draw.has_unresolved_results())
+
+    def test_toss_queries(self):
+        # Trimming in a locked transaction took 4 queries on every toss:
+        # savepoint, insert, trim and release
+        with self.assertNumQueries(2):  # insert, check
+            self.draw.toss()
+        for _ in range(RandomNumber.RESULTS_LIMIT - 1):
+            self.draw.toss()
+        with self.assertNumQueries(3):  # insert, check, trim
+            self.draw.toss()
+        self.assertEqual(self.draw.results.count(), RandomNumber.RESULTS_LIMIT)
+
     def test_repr(self):
         repr(self.draw)
         repr(self.draw.toss())
 
 
+class TestConcurrentTosses(TransactionTestCase):
+    THREADS = 8
+    TOSSES_PER_THREAD = 15
+
+    def test_limit_of_results_holds(self):
+        draw = CoinFactory()
+
+        def toss():
+            tossed = 0
+            try:
+                while tossed < self.TOSSES_PER_THREAD:
+                    try:
+                        Coin.objects.get(id=draw.id).toss()
+                    except OperationalError:  # sqlite table lock, retry
+                        time.sleep(0.001)
+                    else:
+                        tossed += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=toss) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(draw.results.count(), Coin.RESULTS_LIMIT)
+
+
+class TestConcurrentParticipants(TransactionTestCase):
+    THREADS = 8
+
+    def test_facebook_id_is_unique_per_draw(self):
+        draw = LotteryFactory(participants=[])
+        participants = [
+            {"name": f"participant {i}", "facebook_id": str(i)} for i in range(20)
+        ]
+
+        def add():
+            try:
+                while True:
+                    try:
+                        models.Lottery.objects.get(id=draw.id).add_participants(
+                            participants
+                        )
+                    except OperationalError:  # sqlite table lock, retry
+                        time.sleep(0.001)
+                    else:
+                        break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(draw.participants.count(), 20)
+
+    def test_add_participants_reports_created(self):
+        draw = LotteryFactory(participants=[])
+        self.assertEqual(
+            draw.add_participants([{"name": "a", "facebook_id": "1"}, {"name": "b"}]),
+            2,
+        )
+        self.assertEqual(
+            draw.add_participants([{"name": "a", "facebook_id": "1"}, {"name": "b"}]),
+            1,
+        )
+
+
+class TestParticipantDedupMigration(TransactionTestCase):
+    BEFORE = [("api", "0026_result_unresolved_indexes")]
+    AFTER = [("api", "0027_participant_unique_facebook_id")]
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def test_keeps_first_participant_of_each_facebook_id(self):
+        apps = self._migrate(self.BEFORE)
+        Lottery = apps.get_model("api", "Lottery")
+        Participant = apps.get_model("api", "Participant")
+        draw = Lottery.objects.create(private_id="private")
+        other_draw = Lottery.objects.create(private_id="other-private")
+        created_at = dt.datetime(2020, 1, 1, tzinfo=dt.timezone.utc)
+        for id_, draw_, facebook_id, delay in [
+            ("dup-late", draw, "1", 2),
+            ("dup-first", draw, "1", 0),
+            ("dup-tie-b", draw, "2", 0),
+            ("dup-tie-a", draw, "2", 0),
+            ("no-fb-1", draw, None, 0),
+            ("no-fb-2", draw, None, 0),
+            ("other-draw", other_draw, "1", 5),
+        ]:
+            Participant.objects.create(
+                id=id_, draw=draw_, name=id_, facebook_id=facebook_id
+            )
+            Participant.objects.filter(id=id_).update(
+                created_at=created_at + dt.timedelta(seconds=delay)
+            )
+
+        self._migrate(self.AFTER)
+
+        self.assertEqual(
+            set(models.Participant.objects.values_list("id", flat=True)),
+            {"dup-first", "dup-tie-a", "no-fb-1", "no-fb-2", "other-draw"},
+        )
+
+
+class TestSampling(TestCase):
+    def test_unique_results_use_whole_range(self):
+        draw = RandomNumberFactory(range_min=-10, range_max=39, number_of_results=50)
+        for _ in range(20):
+            self.assertEqual(sorted(draw.generate_result()), list(range(-10, 40)))
+
+    def test_unique_letters(self):
+        draw = LetterFactory(number_of_results=26)
+        result = draw.generate_result()
+        self.assertEqual(len(result), 26)
+        self.assertEqual(len(set(result)), 26)
+
+    def test_repeated_results(self):
+        draw = RandomNumberFactory(
+            range_min=1, range_max=1, number_of_results=3, allow_repeated_results=True
+        )
+        self.assertEqual(draw.generate_result(), [1, 1, 1])
+        draw = LetterFactory(number_of_results=100, allow_repeated_results=True)
+        self.assertEqual(len(draw.generate_result()), 100)
+
+    def test_sampling_is_bounded_for_any_range(self):
+        for start, stop, count in [
+            (0, 49, 50),
+            (0, 2**62, 50),
+            (-(2**31), 2**63 - 1, 50),
+            (5, 5, 1),
+        ]:
+            with mock.patch("random.randint", wraps=models.random.randint) as randint:
+                result = models.sample_range(start, stop, count)
+            self.assertEqual(randint.call_count, count)
+            self.assertEqual(len(set(result)), count)
+            self.assertTrue(all(start <= item <= stop for item in result))
+
+
+class TestSampleParticipants(TestCase):
+    def setUp(self):
+        self.draw = LotteryFactory(participants=[])
+        models.Participant.objects.bulk_create(
+            models.Participant(draw=self.draw, name=f"participant {i}")
+            for i in range(100)
+        )
+
+    def test_winners_are_distinct_participants(self):
+        with self.assertNumQueries(2):
+            winners = self.draw.sample_participants(10)
+        self.assertEqual(len(winners), 10)
+        self.assertEqual(len({w["id"] for w in winners}), 10)
+        self.assertEqual(set(winners[0]), {"id", "name", "facebook_id"})
+
+    def test_fewer_participants_than_requested(self):
+        winners = self.draw.sample_participants(500)
+        self.assertEqual(len({w["id"] for w in winners}), 100)
+
+    def test_winners_are_fetched_in_chunks(self):
+        with mock.patch.object(models.Lottery, "SAMPLE_CHUNK_SIZE", 30):
+            winners = self.draw.sample_participants(100)
+        self.assertEqual(len({w["id"] for w in winners}), 100)
+
+    def test_every_participant_can_win(self):
+        winners = set()
+        for _ in range(100):
+            winners.update(w["name"] for w in self.draw.sample_participants(5))
+        self.assertGreater(len(winners), 90)
+
+
 def test_generate_code():
     discount_codes = [created_discount_code() for _ in range(100)]
     assert len(discount_codes) == len(set(discount_codes))
     assert all([len(d) == 8 for d in discount_codes])
+
+
+def _instagram_comment(username):
+    return instagram.Comment(
+        id=f"{username}-id", text="text", username=username, userpic="userpic"
+    )
+
+
+class TestCommentSnapshots(TestCase):
+    def setUp(self):
+        patcher = mock.patch("eas.api.instagram.get_comments")
+        self.get_comments = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.get_comments.return_value = [
+            _instagram_comment("a"),
+            _instagram_comment("b"),
+            _instagram_comment("a"),
+        ]
+        self.draw = InstagramFactory()
+
+    def test_toss_records_the_snapshot(self):
+        result = self.draw.toss()
+        snapshot = result.comment_snapshot
+        self.assertEqual(snapshot.comment_count, 2)
+        self.assertEqual(
+            models.CommentSnapshot.objects.get(pk=snapshot.pk).comments["a"],
+            {"username": "a", "userpic": "userpic", "text": "text", "id": "a-id"},
+        )
+        self.assertIn(result.value[0]["comment"]["username"], {"a", "b"})
+
+    def test_snapshot_is_reused_while_recent(self):
+        with freezegun.freeze_time() as frozen_time:
+            first = self.draw.toss().comment_snapshot
+            frozen_time.tick(settings.COMMENT_SNAPSHOT_MAX_AGE - 1)
+            second = self.draw.toss().comment_snapshot
+        self.assertEqual(first, second)
+        self.get_comments.assert_called_once()
+
+    def test_refresh_adds_new_commenters(self):
+        with freezegun.freeze_time() as frozen_time:
+            first = self.draw.toss().comment_snapshot
+            frozen_time.tick(settings.COMMENT_SNAPSHOT_MAX_AGE)
+            self.get_comments.return_value = [
+                _instagram_comment("b"),
+                _instagram_comment("c"),
+            ]
+            second = self.draw.toss().comment_snapshot
+        self.assertNotEqual(first, second)
+        self.assertEqual(sorted(second.comments), ["a", "b", "c"])
+
+    def test_criteria_change_takes_a_new_snapshot(self):
+        first = self.draw.toss().comment_snapshot
+        self.draw.min_mentions = 1
+        self.get_comments.return_value = [_instagram_comment("c")]
+        second = self.draw.toss().comment_snapshot
+        self.assertEqual(list(second.comments), ["c"])
+        self.assertEqual(self.get_comments.call_count, 2)
+        self.assertNotEqual(first, second)
+
+    def test_unused_snapshots_are_deleted_once_stale(self):
+        max_age = settings.COMMENT_SNAPSHOT_MAX_AGE
+        with freezegun.freeze_time() as frozen_time:
+            used = self.draw.toss().comment_snapshot
+            self.draw.min_mentions = 1
+            recent = self.draw.comment_snapshot()  # A concurrent toss may use it
+            self.draw.min_mentions = 0
+            frozen_time.tick(max_age)
+            latest = self.draw.comment_snapshot()
+            self.assertCountEqual(
+                self.draw.comment_snapshots.all(), [used, recent, latest]
+            )
+            frozen_time.tick(max_age + 1)
+            newest = self.draw.comment_snapshot()
+        self.assertCountEqual(self.draw.comment_snapshots.all(), [used, newest])
+
+    def test_scheduled_results_record_the_snapshot(self):
+        self.draw.schedule_toss(dt.datetime.now(dt.timezone.utc))
+        self.draw.resolve_scheduled_results()
+        result = self.draw.results.get()
+        self.assertIsNotNone(result.value)
+        self.assertEqual(result.comment_snapshot, self.draw.comment_snapshots.get())
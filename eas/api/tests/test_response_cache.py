@@ -0,0 +1,66 @@
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from eas.api import models, response_cache
+
+
+class TestResponseCache(TestCase):
+    def setUp(self):
+        caches["draws"].clear()
+        self.addCleanup(caches["draws"].clear)
+
+    def test_miss_and_hit(self):
+        stats = response_cache.stats()
+        assert response_cache.get(models.Coin, "id") is None
+        response_cache.put(models.Coin, "id", {"id": "id"})
+        assert response_cache.get(models.Coin, "id") == ({"id": "id"}, None)
+        assert response_cache.stats() == {
+            "hits": stats["hits"] + 1,
+            "misses": stats["misses"] + 1,
+        }
+
+    def test_other_draw_type_is_a_miss(self):
+        response_cache.put(models.Coin, "id", {"id": "id"})
+        assert response_cache.get(models.Letter, "id") is None
+
+    def test_invalidate(self):
+        response_cache.put(models.Coin, "id", {"id": "id"})
+        response_cache.put(models.Coin, "private-id", {"private_id": "private-id"})
+        response_cache.invalidate("id", "private-id")
+        assert response_cache.get(models.Coin, "id") is None
+        assert response_cache.get(models.Coin, "private-id") is None
+
+    def test_draw_save_and_delete_invalidate(self):
+        draw = models.Coin.objects.create()
+        response_cache.put(models.Coin, draw.id, {})
+        response_cache.put(models.Coin, draw.private_id, {})
+        with self.captureOnCommitCallbacks(execute=True):
+            draw.save()
+        assert response_cache.get(models.Coin, draw.id) is None
+        assert response_cache.get(models.Coin, draw.private_id) is None
+        response_cache.put(models.Coin, draw.id, {})
+        with self.captureOnCommitCallbacks(execute=True):
+            draw.delete()
+        assert response_cache.get(models.Coin, draw.id) is None
+
+    def test_invalidation_waits_for_the_commit(self):
+        draw = models.Coin.objects.create()
+        with self.captureOnCommitCallbacks(execute=True):
+            draw.save()
+            # A read before the commit caches the previous payload
+            response_cache.put(models.Coin, draw.id, {"stale": True})
+            assert response_cache.get(models.Coin, draw.id) is not None
+        assert response_cache.get(models.Coin, draw.id) is None
+
+    def test_payment_invalidates_on_commit(self):
+        draw = models.Coin.objects.create()
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Payment.objects.create(draw_id=draw.id, payed=True)
+            response_cache.put(models.Coin, draw.private_id, {"stale": True})
+        assert response_cache.get(models.Coin, draw.private_id) is None
+
+    @override_settings(DRAW_RESPONSE_CACHE="default")
+    def test_cache_alias_from_settings(self):
+        response_cache.put(models.Coin, "id", {"id": "id"})
+        assert caches["draws"].get("draw-response:id") is None
+        caches["default"].delete("draw-response:id")
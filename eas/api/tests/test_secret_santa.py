@@ -0,0 +1,137 @@
+import collections
+import itertools
+import random
+from unittest import TestCase
+
+from eas.api.secret_santa import resolve_secret_santa
+
+
+def _is_feasible(participants, exclusions):
+    return any(
+        all(s != t and (s, t) not in exclusions for s, t in zip(participants, perm))
+        for perm in itertools.permutations(participants)
+    )
+
+
+def chi_square(counts, categories):
+    """Pearson's statistic of the counts against a uniform distribution"""
+    expected = sum(counts.values()) / len(categories)
+    return sum((counts[c] - expected) ** 2 / expected for c in categories)
+
+
+class TestResolveSecretSanta(TestCase):
+    def assert_valid(self, participants, exclusions, result):
+        self.assertEqual([source for source, _ in result], participants)
+        self.assertEqual(sorted(t for _, t in result), sorted(participants))
+        for source, target in result:
+            self.assertNotEqual(source, target)
+            self.assertNotIn((source, target), exclusions)
+
+    def test_without_exclusions(self):
+        participants = ["a", "b", "c", "d"]
+        self.assert_valid(participants, set(), resolve_secret_santa(participants, []))
+
+    def test_single_valid_assignment(self):
+        participants = ["a", "b", "c"]
+        exclusions = [("a", "c"), ("b", "a"), ("c", "b")]
+        result = resolve_secret_santa(participants, exclusions)
+        self.assertEqual(result, [("a", "b"), ("b", "c"), ("c", "a")])
+
+    def test_infeasible(self):
+        self.assertIsNone(resolve_secret_santa(["a"], []))
+        self.assertIsNone(resolve_secret_santa(["a", "b"], [("a", "b")]))
+        # Nobody can give a present to c
+        self.assertIsNone(
+            resolve_secret_santa(["a", "b", "c"], [("a", "c"), ("b", "c")])
+        )
+        # Everyone has someone to give to and receive from, but c and d both
+        # can only give to a
+        self.assertIsNone(
+            resolve_secret_santa(
+                ["a", "b", "c", "d"],
+                [("c", "b"), ("c", "d"), ("d", "b"), ("d", "c")],
+            )
+        )
+
+    def test_repeated_names_are_not_matched(self):
+        self.assertIsNone(resolve_secret_santa(["a", "a"], []))
+        result = resolve_secret_santa(["a", "a", "b", "b"], [])
+        self.assertCountEqual(result, [("a", "b"), ("a", "b"), ("b", "a"), ("b", "a")])
+
+    def test_unknown_names_in_exclusions_are_ignored(self):
+        participants = ["a", "b"]
+        result = resolve_secret_santa(participants, [("a", "z"), ("z", "b")])
+        self.assertEqual(result, [("a", "b"), ("b", "a")])
+
+    def test_matches_exhaustive_search(self):
+        rng = random.Random(42)
+        for _ in range(500):
+            participants = [f"p{i}" for i in range(rng.randint(2, 6))]
+            density = rng.random()
+            exclusions = {
+                (s, t)
+                for s in participants
+                for t in participants
+                if rng.random() < density
+            }
+            result = resolve_secret_santa(participants, list(exclusions))
+            if _is_feasible(participants, exclusions):
+                self.assert_valid(participants, exclusions, result)
+            else:
+                self.assertIsNone(result)
+
+    def test_single_cycle_solution(self):
+        # Each participant can only give a present to the next one, the only
+        # solution is a cycle through everyone
+        participants = [f"p{i}" for i in range(300)]
+        next_participant = dict(zip(participants, participants[1:] + participants[:1]))
+        exclusions = [
+            (s, t)
+            for s in participants
+            for t in participants
+            if t != next_participant[s]
+        ]
+        result = resolve_secret_santa(participants, exclusions)
+        self.assertEqual(result, list(next_participant.items()))
+
+    def test_large_group(self):
+        participants = [f"p{i}" for i in range(3000)]
+        rng = random.Random(0)
+        exclusions = [
+            (s, t) for s in participants for t in rng.sample(participants, 30)
+        ]
+        result = resolve_secret_santa(participants, exclusions)
+        self.assert_valid(participants, set(exclusions), result)
+
+
+class TestFairness(TestCase):
+    RUNS = 9000
+
+    def setUp(self):
+        state = random.getstate()
+        self.addCleanup(random.setstate, state)
+        random.seed(2024)
+
+    def assert_uniform(self, participants, exclusions, critical_value):
+        counts = collections.Counter(
+            tuple(resolve_secret_santa(participants, exclusions))
+            for _ in range(self.RUNS)
+        )
+        valid = [
+            tuple(zip(participants, perm))
+            for perm in itertools.permutations(participants)
+            if all(
+                s != t and (s, t) not in exclusions for s, t in zip(participants, perm)
+            )
+        ]
+        self.assertLessEqual(set(counts), set(valid))
+        self.assertLess(chi_square(counts, valid), critical_value)
+
+    def test_assignments_are_uniform(self):
+        # 44 derangements of 5, critical value at p=0.001 for 43 degrees
+        self.assert_uniform(["a", "b", "c", "d", "e"], set(), 77.42)
+
+    def test_assignments_with_exclusions_are_uniform(self):
+        # 20 valid assignments, critical value at p=0.001 for 19 degrees
+        exclusions = {("a", "b"), ("b", "c"), ("c", "d")}
+        self.assert_uniform(["a", "b", "c", "d", "e"], exclusions, 43.82)
@@ -0,0 +1,162 @@
+import tempfile
+import threading
+import unittest.mock
+from unittest import TestCase
+
+from django.core.cache import caches
+from django.test import override_settings
+
+from eas.api import social_cache
+
+
+class WaitCountingEvent(threading.Event):
+    """Event that signals each call to wait"""
+
+    def __init__(self):
+        super().__init__()
+        self.waiting = threading.Semaphore(0)
+
+    def wait(self, timeout=None):
+        self.waiting.release()
+        return super().wait(timeout)
+
+
+class TestSocialCache(TestCase):
+    def setUp(self):
+        caches["social"].clear()
+        self.addCleanup(caches["social"].clear)
+        patcher = unittest.mock.patch.object(social_cache, "POLL_INTERVAL", 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.fetching = threading.Event()
+        self.release = threading.Event()
+
+    def test_miss_and_hit(self):
+        fetch = unittest.mock.Mock(return_value=["comment"])
+        assert social_cache.get_or_fetch("key", fetch) == ["comment"]
+        assert social_cache.get_or_fetch("key", fetch) == ["comment"]
+        fetch.assert_called_once_with()
+
+    def test_timeout(self):
+        with unittest.mock.patch.object(caches["social"], "set") as cache_set:
+            social_cache.cached("short", timeout=60)(lambda: "value")()
+        assert cache_set.call_args.args[1:] == ("value", 60)
+
+    def test_errors_are_not_cached(self):
+        fetch = unittest.mock.Mock(side_effect=[ValueError, ["comment"]])
+        with self.assertRaises(ValueError):
+            social_cache.get_or_fetch("key", fetch)
+        assert social_cache.get_or_fetch("key", fetch) == ["comment"]
+        assert fetch.call_count == 2
+
+    def test_decorator_keys_by_arguments(self):
+        fetch = unittest.mock.Mock(side_effect=lambda media_pk: [media_pk])
+        cached_fetch = social_cache.cached("comments")(fetch)
+        assert cached_fetch("1") == ["1"]
+        assert cached_fetch("2") == ["2"]
+        assert cached_fetch("1") == ["1"]
+        assert social_cache.cached("previews")(fetch)("1") == ["1"]
+        assert fetch.call_count == 3
+
+    def _start_waiting(self, threads):
+        """Starts the threads once the first one is fetching the key
+
+        Returns when they are all waiting for it.
+        """
+        threads[0].start()
+        self.fetching.wait(5)
+        flight = social_cache._flights["key"]  # pylint: disable=protected-access
+        flight.done = WaitCountingEvent()
+        for thread in threads[1:]:
+            thread.start()
+        for _ in threads[1:]:
+            flight.done.waiting.acquire(timeout=5)
+
+    def test_concurrent_misses_fetch_once(self):
+        def slow_fetch():
+            self.fetching.set()
+            self.release.wait(5)
+            return ["comment"]
+
+        fetch = unittest.mock.Mock(side_effect=slow_fetch)
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(social_cache.get_or_fetch("key", fetch))
+            )
+            for _ in range(5)
+        ]
+        self._start_waiting(threads)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        fetch.assert_called_once_with()
+        assert results == [["comment"]] * 5
+        assert social_cache.stats() == {"hits": 0, "issued": 1, "coalesced": 4}
+
+    def test_concurrent_misses_share_the_error(self):
+        def failing_fetch():
+            self.fetching.set()
+            self.release.wait(5)
+            raise ValueError("Upstream failed")
+
+        fetch = unittest.mock.Mock(side_effect=failing_fetch)
+        errors = []
+
+        def call():
+            try:
+                social_cache.get_or_fetch("key", fetch)
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        self._start_waiting(threads)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        fetch.assert_called_once_with()
+        assert len(errors) == 3
+        assert social_cache.get_or_fetch("key", lambda: ["comment"]) == ["comment"]
+
+    def test_waits_for_the_lock_holder(self):
+        caches["social"].add("key:lock", True)
+        threading.Timer(0.05, caches["social"].set, ("key", ["comment"])).start()
+        fetch = unittest.mock.Mock()
+        assert social_cache.get_or_fetch("key", fetch) == ["comment"]
+        fetch.assert_not_called()
+        assert social_cache.stats() == {"hits": 0, "issued": 0, "coalesced": 1}
+
+    def test_stored_by_another_process_after_the_miss(self):
+        caches["social"].set("key", ["comment"])
+        fetch = unittest.mock.Mock()
+        # pylint: disable=protected-access
+        assert social_cache._fetch_once("key", fetch, None) == ["comment"]
+        fetch.assert_not_called()
+        assert social_cache.stats() == {"hits": 0, "issued": 0, "coalesced": 1}
+
+    def test_stats(self):
+        fetch = unittest.mock.Mock(return_value=["comment"])
+        social_cache.get_or_fetch("key", fetch)
+        social_cache.get_or_fetch("key", fetch)
+        social_cache.get_or_fetch("key", fetch)
+        assert social_cache.stats() == {"hits": 2, "issued": 1, "coalesced": 0}
+
+    def test_shared_through_file_cache(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(
+            CACHES={
+                "files": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": location,
+                }
+            },
+            SOCIAL_CACHE="files",
+        ):
+            fetch = unittest.mock.Mock(return_value=["comment"])
+            social_cache.get_or_fetch("key", fetch)
+            # Another worker, with its own cache instance
+            worker = threading.Thread(
+                target=social_cache.get_or_fetch, args=("key", fetch)
+            )
+            worker.start()
+            worker.join()
+            fetch.assert_called_once_with()
@@ -1,8 +1,14 @@
+import functools
 import logging
 import re
+import urllib.parse
 from dataclasses import dataclass
 
 import requests
+import requests.adapters
+from django.conf import settings
+
+from eas.api import social_cache
 
 from . import lamatok
 
@@ -10,6 +16,9 @@ LOG = logging.getLogger(__name__)
 MENTION_RE = re.compile(r"(^|[^\w])@([\w\_\.]+)")
 TIKTOK_RE = re.compile(r"/video/([^?/&]*)")
 ONE_MINUTE = 60
+MAX_REDIRECTS = 5  # Followed to resolve a short link
+SHORT_URL_TIMEOUT = 10  # seconds per request
+SHORT_URL_TTL = 24 * 60 * 60  # seconds, short links don't change
 
 NotFoundError = lamatok.NotFoundError
 InvalidURL = lamatok.InvalidURL
@@ -25,53 +34,96 @@ class Comment:
     userid: str
 
 
+@functools.lru_cache(None)
+def _session():
+    retry = requests.adapters.Retry(
+        total=2,
+        backoff_factor=0.5,
+        status_forcelist=[500, 503, 504],
+    )
+    s = requests.Session()
+    s.mount("https://", requests.adapters.HTTPAdapter(max_retries=retry))
+    return s
+
+
+@social_cache.cached("tiktok-short-url", timeout=SHORT_URL_TTL)
+def _resolve_short_url(url):
+    """Follows the redirects of a short link up to the URL of the video"""
+    for _ in range(MAX_REDIRECTS):
+        response = _session().get(url, allow_redirects=False, timeout=SHORT_URL_TIMEOUT)
+        if not response.is_redirect:
+            break
+        url = urllib.parse.urljoin(url, response.headers["Location"])
+        if match := TIKTOK_RE.search(url):
+            return match.group(1)
+    raise InvalidURL(f"Invalid tiktok URL {url}")
+
+
 def _extract_media_pk(url):
     if match := TIKTOK_RE.search(url):
         return match.group(1)
-    response = requests.get(url, allow_redirects=False)
-    if response.status_code in (301, 302, 308):
-        return _extract_media_pk(response.headers["Location"])
-    raise InvalidURL(f"Invalid tiktok URL {url}")
+    return _resolve_short_url(url)
+
 
+def _to_comment(comment):
+    try:
+        return Comment(
+            id=comment["cid"],
+            url=comment["share_info"]["url"],
+            text=comment["text"],
+            username=comment["user"]["nickname"],
+            userpic=comment["user"]["avatar_thumb"]["url_list"][0],
+            userid=comment["user"]["unique_id"],
+        )
+    except KeyError as e:  # pragma: no cover
+        LOG.error("Comment does not contain field %s: %s", e, comment, exc_info=True)
+        return None
 
-def _fetch_comments(url):
-    """Fetch all comments from tiktok"""
-    media_pk = _extract_media_pk(url)
-    response = lamatok.fetch_comments(media_pk)
-    LOG.info("Fetched %s comments for %s", len(response), url)
-    if not response:
-        raise NotFoundError(f"No posts found for {url}")
+
+# A refreshed comment snapshot must not be built from the comments of the
+# previous one, so they expire together
+@social_cache.cached("tiktok-comments", timeout=settings.COMMENT_SNAPSHOT_MAX_AGE)
+def _fetch_comments(media_pk, min_mentions, max_comments):
+    """Fetch the comments that match the criteria from tiktok
+
+    Stops paging once the comments are from max_comments distinct users,
+    which takes at least max_comments comments.
+    """
+    fetched = 0
+    usernames = set()
     res = []
-    for comment in response:
-        try:
-            res.append(
-                Comment(
-                    id=comment["cid"],
-                    url=comment["share_info"]["url"],
-                    text=comment["text"],
-                    username=comment["user"]["nickname"],
-                    userpic=comment["user"]["avatar_thumb"]["url_list"][0],
-                    userid=comment["user"]["unique_id"],
-                )
-            )
-        except KeyError as e:  # pragma: no cover
-            LOG.error(
-                "Comment does not contain field %s: %s", e, comment, exc_info=True
-            )
+    for raw_comment in lamatok.iter_comments(media_pk, wanted=max_comments):
+        fetched += 1
+        comment = _to_comment(raw_comment)
+        if comment is None:  # pragma: no cover
+            continue
+        if len(MENTION_RE.findall(comment.text)) < min_mentions:
+            continue
+        res.append(comment)
+        usernames.add(comment.username)
+        if len(usernames) >= max_comments:
+            LOG.info("Reached %s commenters for %s", max_comments, media_pk)
+            break
+    LOG.info("Fetched %s comments for %s", fetched, media_pk)
+    if not fetched:
+        raise NotFoundError(f"No posts found for {media_pk}")
     return res
 
 
-def get_comments(url, min_mentions=0):  # pragma: no cover
-    """Fetch and filter comments"""
+def get_comments(url, min_mentions=0, max_comments=None):
+    """Fetch and filter comments
+
+    Comments are fetched until there are max_comments distinct users,
+    settings.TIKTOK_MAX_COMMENTS by default.
+    """
+    if max_comments is None:
+        max_comments = settings.TIKTOK_MAX_COMMENTS
     LOG.info(
-        "Fetching comments for %r, mentions=%s",
+        "Fetching comments for %r, mentions=%s, max_comments=%s",
         url,
         min_mentions,
+        max_comments,
     )
-    ret = []
-    for comment in _fetch_comments(url):
-        if len(MENTION_RE.findall(comment.text)) < min_mentions:
-            continue
-        ret.append(comment)
+    ret = _fetch_comments(_extract_media_pk(url), min_mentions, max_comments)
     LOG.info("%s comments match criteria for %s", len(ret), url)
     return ret
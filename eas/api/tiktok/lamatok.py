@@ -1,16 +1,17 @@
+import concurrent.futures
 import contextlib
-import datetime as dt
 import functools
 import logging
 
-import cachetools
 import requests
 from django.conf import settings
 
+from eas.api import circuit_breaker
+
 LAMATOK_APIK = settings.LAMATOK_APIK
 LOG = logging.getLogger(__name__)
+BREAKER = circuit_breaker.CircuitBreaker("lamatok")
 MAX_PAGE_LAMATOK = 100
-ONE_MINUTE = 60  # seconds
 
 
 class NotFoundError(Exception):
@@ -24,7 +25,7 @@ class InvalidURL(Exception):
 @functools.lru_cache(None)
 def _session():  # pragma: no cover
     retry = requests.adapters.Retry(
-        total=3,
+        total=1,  # The circuit breaker bounds the time spent on failures
         backoff_factor=0.5,
         status_forcelist=[500, 503, 504, 520, 521, 522, 524],
     )
@@ -34,32 +35,25 @@ def _session():  # pragma: no cover
 
 
 def _is_a_tiktok_post(media_pk):
-    response = _session().get(
+    response = BREAKER.get(
+        _session(),
         "https://api.lamatok.com/v1/media/by/id",
         params={"id": media_pk, "access_key": LAMATOK_APIK},
-        timeout=ONE_MINUTE * 2,
     )
     return response.ok
 
 
-@cachetools.cached(
-    cachetools.TTLCache(
-        maxsize=500,
-        timer=dt.datetime.now,
-        ttl=dt.timedelta(hours=1),
-    )
-)
-def fetch_comments(media_pk):  # pragma: no cover
-    LOG.info("Sending request to lamatok for %s", media_pk)
-    response = _session().get(
+def _fetch_page(media_pk, cursor):
+    LOG.info("Sending request to lamatok for %s, cursor %s", media_pk, cursor)
+    response = BREAKER.get(
+        _session(),
         "https://api.lamatok.com/v1/media/comments/by/id",
         params={
             "id": media_pk,
             "count": MAX_PAGE_LAMATOK,
+            "cursor": cursor,
             "access_key": LAMATOK_APIK,
-            # "cursor": None # We could page here
         },
-        timeout=ONE_MINUTE * 2,
     )
     if not response.ok:
         LOG.warning("Failed lamatok request! %s", response.text)
@@ -69,8 +63,39 @@ def fetch_comments(media_pk):  # pragma: no cover
         if exc_type == "PrivateMedia":
             raise InvalidURL("Private post")
         if exc_type == "CommentsNotFoundError":
-            if _is_a_tiktok_post(media_pk):
-                return []
+            if cursor or _is_a_tiktok_post(media_pk):
+                return {"comments": [], "has_more": 0}
             raise InvalidURL("Invalid post URL")
     response.raise_for_status()
-    return response.json()["comments"]
+    return response.json()
+
+
+def iter_comments(media_pk, wanted=None):
+    """Yields the comments of the post, following the cursor of the pages
+
+    While fewer than wanted comments have been fetched, the next page is
+    surely needed and is requested in the background as the comments of
+    the current one are consumed. Past that, it is only requested if the
+    consumer asks for more. The cursor of each page is needed to request
+    the next one. Comments repeated across pages are skipped.
+    """
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    try:
+        cursor = 0
+        page = _fetch_page(media_pk, cursor)
+        seen = set()
+        while True:
+            comments = [c for c in page["comments"] if c.get("cid") not in seen]
+            seen.update(c.get("cid") for c in comments)
+            has_next = page.get("has_more") and page.get("cursor", 0) > cursor
+            next_page = None
+            if has_next:
+                cursor = page["cursor"]
+                if wanted is None or len(seen) < wanted:
+                    next_page = pool.submit(_fetch_page, media_pk, cursor)
+            yield from comments
+            if not has_next:
+                return
+            page = next_page.result() if next_page else _fetch_page(media_pk, cursor)
+    finally:  # Don't wait for a prefetched page nobody will consume
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -1,30 +1,100 @@
+import contextlib
 import datetime as dt
+import itertools
 import logging
+import types
+from dataclasses import dataclass
 
 import requests.exceptions
 from django.conf import settings
 from django.contrib.auth import get_user_model, login, logout
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q
 from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action, api_view
-from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.exceptions import APIException, PermissionDenied, ValidationError
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 
-from . import amazonsqs
+from . import amazonsqs, circuit_breaker
 from . import email as email_service
-from . import instagram, models, paypal, secret_santa, serializers, stripe, tiktok
+from . import (
+    instagram,
+    models,
+    parsers,
+    paypal,
+    response_cache,
+    secret_santa,
+    serializers,
+    stripe,
+    tiktok,
+)
 
 LOG = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True)
+class DrawVersion:
+    """State of a draw that identifies its serialized representation"""
+
+    updated_at: dt.datetime
+    pending_results: int  # Scheduled results without a value
+
+    @classmethod
+    def from_draw(cls, draw):
+        return cls(
+            updated_at=draw.updated_at,
+            pending_results=sum(1 for r in draw.results.all() if r.value is None),
+        )
+
+    @property
+    def etag(self):
+        return f'"{self.updated_at.timestamp():.6f}-{self.pending_results}"'
+
+    @property
+    def last_modified(self):
+        return int(self.updated_at.timestamp())
+
+    def add_headers(self, response):
+        response["ETag"] = self.etag
+        response["Last-Modified"] = http_date(self.last_modified)
+        return response
+
+    def not_modified_response(self, request):
+        """Returns a 304 response if the client has this version, None otherwise"""
+        response = get_conditional_response(
+            request, etag=self.etag, last_modified=self.last_modified
+        )
+        return response and self.add_headers(response)
+
+
 class BaseDrawViewSet(
     mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
 ):
 
     MODEL = None  # To be set by concrete implementations
     PRIVATE_FIELDS = ["private_id"]  # Fields to show only to the owner
+    PREFETCH_RELATED = ()  # Draw specific relations used by the serializer
+
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .prefetch_related(
+                Prefetch(
+                    "results",
+                    queryset=models.Result.objects.order_by("-created_at"),
+                ),
+                "metadata",
+                "_payments",
+                *self.PREFETCH_RELATED,
+            )
+        )
 
     @classmethod
     def remove_private_fields(cls, data):
@@ -42,34 +112,68 @@ class BaseDrawViewSet(
             serializer.data, status=status.HTTP_201_CREATED, headers=headers
         )
 
+    def _get_draw_with_access(self, pk, queryset=None):
+        """Fetches a draw by its public or private id in a single query
+
+        Returns the draw and whether the private id was used, which
+        grants write access to it.
+        """
+        if queryset is None:
+            queryset = self.MODEL.objects.all()
+        draws = list(queryset.filter(Q(id=pk) | Q(private_id=pk))[:2])
+        if not draws:
+            raise Http404(f"No {self.MODEL.__name__} matches the given query.")
+        for draw in draws:
+            if draw.id == pk:
+                return draw, False
+        return draws[0], True
+
     def _get_draw(self, pk):
-        try:
-            return get_object_or_404(self.MODEL, id=pk)
-        except Http404:
-            return get_object_or_404(self.MODEL, private_id=pk)
+        return self._get_draw_with_access(pk)[0]
+
+    def _get_draw_version(self, pk):
+        """Fetches the version of a draw without loading its relations"""
+        versions = (
+            self.MODEL.objects.filter(Q(id=pk) | Q(private_id=pk))
+            .annotate(
+                pending_results=Count("results", filter=Q(results__value__isnull=True))
+            )
+            .values("updated_at", "pending_results")[:1]
+        )
+        return next((DrawVersion(**version) for version in versions), None)
 
-    def _toss_unresolved_results(self, instance):
-        if not instance.has_unresolved_results():
-            return
-        try:
-            self._ready_to_toss_check(instance)
-        except ValidationError:
-            pass
-        else:
-            instance.resolve_scheduled_results()
+    @staticmethod
+    def _is_conditional(request):
+        return any(
+            header in request.META
+            for header in ("HTTP_IF_NONE_MATCH", "HTTP_IF_MODIFIED_SINCE")
+        )
 
     def retrieve(
         self, request, *args, pk=None, **kwargs
     ):  # pylint: disable=unused-argument, arguments-differ
         LOG.info("Retrieving draw by id: %s", pk)
-        instance = self._get_draw(pk)
-        self._toss_unresolved_results(instance)
+        cached = response_cache.get(self.MODEL, pk)
+        if cached is not None:
+            LOG.info("Returning cached draw with id: %s", pk)
+            result_data, version = cached
+            not_modified = version.not_modified_response(request)
+            return not_modified or version.add_headers(Response(result_data))
+        if self._is_conditional(request):
+            version = self._get_draw_version(pk)
+            not_modified = version and version.not_modified_response(request)
+            if not_modified:
+                LOG.info("Draw with id %s not modified", pk)
+                return not_modified
+        instance, write_access = self._get_draw_with_access(pk, self.get_queryset())
         serializer = self.get_serializer(instance)
         result_data = serializer.data
-        if pk != result_data["private_id"]:
+        if not write_access:
             self.remove_private_fields(result_data)
+        version = DrawVersion.from_draw(instance)
+        response_cache.put(self.MODEL, pk, result_data, version)
         LOG.info("Returning draw with id: %s", pk)
-        return Response(result_data)
+        return version.add_headers(Response(result_data))
 
     @action(methods=["post"], detail=True)
     def toss(self, request, pk):
@@ -80,16 +184,35 @@ class BaseDrawViewSet(
         schedule_date = serializer.validated_data.get("schedule_date")
         if schedule_date:
             result = draw.schedule_toss(schedule_date)
+            if schedule_date <= dt.datetime.now(dt.timezone.utc):
+                self._resolve_now_if_ready(draw)
+                result.refresh_from_db()
         else:
-            self._ready_to_toss_check(draw)
-            result = draw.toss()
+            result = self._checked_toss(draw)
         result_serializer = serializers.ResultSerializer(result)
         LOG.info("Generated result %s", result_serializer.data)
         draw.save()  # Updates updated_at
         return Response(result_serializer.data)
 
-    def _ready_to_toss_check(self, _):  # pylint: disable=no-self-use
-        pass
+    def _ready_to_toss_check(self, draw):  # pylint: disable=no-self-use
+        try:
+            draw.ready_to_toss_check()
+        except models.NotReadyToToss as e:
+            raise ValidationError(str(e)) from None
+
+    def _checked_toss(self, draw):
+        """Tosses the draw if it is ready, see _ready_to_toss_check"""
+        self._ready_to_toss_check(draw)
+        return draw.toss()
+
+    def _resolve_now_if_ready(self, draw):
+        """Resolves due results, otherwise they are left to the scheduler"""
+        try:
+            self._ready_to_toss_check(draw)
+        except APIException:  # Not ready or the comments couldn't be fetched
+            LOG.info("Leaving the results of %s to the scheduler", draw.private_id)
+        else:
+            draw.resolve_scheduled_results()
 
 
 class RandomNumberViewSet(BaseDrawViewSet):
@@ -102,75 +225,97 @@ class RandomNumberViewSet(BaseDrawViewSet):
 class ParticipantsMixin:
     """Adds the participant related endpoints"""
 
+    BULK_VALIDATION_BATCH_SIZE = 1000  # Participants validated at once
+    BULK_MAX_PARTICIPANTS = 10000  # Participants added in a single request
+
     @action(methods=["post"], detail=True)
     def participants(self, request, pk):
         LOG.info("Adding participant to draw %s", pk)
         draw = self._get_draw(pk)
         serializer = serializers.ParticipantSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save(draw=draw)
+        draw.add_participants([serializer.validated_data])
         LOG.info("Participant %s added", request.data)
-
-        # Check for duplicated participants
-        draw = self._get_draw(pk)
-        facebook_participants_id = set()
-        for participant in draw.participants.all():
-            facebook_id = participant.facebook_id
-            if facebook_id is None:
-                pass
-            elif facebook_id in facebook_participants_id:
-                participant.delete()
-            else:
-                facebook_participants_id.add(facebook_id)
-        draw.save()  # Updates updated_at
         return Response({}, status.HTTP_201_CREATED)
 
+    @action(
+        methods=["post"],
+        detail=True,
+        url_path="participants/bulk",
+        url_name="participants-bulk",
+        parser_classes=[JSONParser, parsers.CSVParser, parsers.NDJSONParser],
+    )
+    def bulk_participants(self, request, pk):
+        """Adds a list of participants, as a JSON array, CSV or NDJSON
+
+        Needs the private id of the draw. Participants with a facebook_id
+        already in the draw are skipped. Either all the participants are
+        added or none if any is invalid or there are more than
+        BULK_MAX_PARTICIPANTS.
+        """
+        LOG.info("Adding participants in bulk to draw %s", pk)
+        draw, write_access = self._get_draw_with_access(pk)
+        if not write_access:
+            raise PermissionDenied("The private id of the draw is required")
+        # JSON arrays are parsed as lists, CSV and NDJSON bodies as generators
+        if not isinstance(request.data, (list, types.GeneratorType)):
+            raise ValidationError("Expected a list of participants")
+        participants = self._validated_participants(request.data)
+        created = draw.add_participants(participants)
+        LOG.info("Added %s participants to draw %s", created, pk)
+        return Response({"created": created}, status.HTTP_201_CREATED)
+
+    @classmethod
+    def _validated_participants(cls, data):
+        """Validates the participants lazily, in batches"""
+        data = iter(data)
+        offset = 0
+        while batch := list(itertools.islice(data, cls.BULK_VALIDATION_BATCH_SIZE)):
+            if offset + len(batch) > cls.BULK_MAX_PARTICIPANTS:
+                raise ValidationError(
+                    f"At most {cls.BULK_MAX_PARTICIPANTS} participants can be added"
+                )
+            serializer = serializers.ParticipantSerializer(data=batch, many=True)
+            if not serializer.is_valid():
+                raise ValidationError(
+                    {
+                        str(offset + index): errors
+                        for index, errors in enumerate(serializer.errors)
+                        if errors
+                    }
+                )
+            yield from serializer.validated_data
+            offset += len(batch)
+
 
 class RaffleViewSet(BaseDrawViewSet, ParticipantsMixin):
     MODEL = models.Raffle
     serializer_class = serializers.RaffleSerializer
+    PREFETCH_RELATED = ("prize_set", "participant_set")
 
     queryset = MODEL.objects.all()
 
-    def _ready_to_toss_check(self, draw):  # pylint: disable=no-self-use
-        if not draw.participants.count():
-            raise ValidationError(
-                f"The draw needs to have at least {draw.prizes.count()}"
-                " participants."
-            )
-
 
 class LotteryViewSet(BaseDrawViewSet, ParticipantsMixin):
     MODEL = models.Lottery
     serializer_class = serializers.LotterySerializer
+    PREFETCH_RELATED = ("participant_set",)
 
     queryset = MODEL.objects.all()
 
-    def _ready_to_toss_check(self, draw):  # pylint: disable=no-self-use
-        if draw.participants.count() < draw.number_of_results:
-            raise ValidationError(
-                f"The draw needs to have at least {draw.number_of_results}"
-                " participants."
-            )
-
 
 class GroupsViewSet(BaseDrawViewSet, ParticipantsMixin):
     MODEL = models.Groups
     serializer_class = serializers.GroupsSerializer
+    PREFETCH_RELATED = ("participant_set",)
 
     queryset = MODEL.objects.all()
 
-    def _ready_to_toss_check(self, draw):  # pylint: disable=no-self-use
-        if draw.participants.count() < draw.number_of_groups:
-            raise ValidationError(
-                f"The draw needs to have at least {draw.number_of_groups}"
-                " participants."
-            )
-
 
 class TournamentViewSet(BaseDrawViewSet, ParticipantsMixin):
     MODEL = models.Tournament
     serializer_class = serializers.TournamentSerializer
+    PREFETCH_RELATED = ("participant_set",)
     queryset = MODEL.objects.all()
 
 
@@ -226,28 +371,30 @@ class SecretSantaSet(
         results = secret_santa.resolve_secret_santa(participants, exclusions)
         if not results:
             raise ValidationError("Unable to match participants")
-        draw = models.SecretSanta()
-        draw.save()
         emails = []
         phones = []
-        for source, target in results:
-            result = models.SecretSantaResult(source=source, target=target, draw=draw)
-            result.save()
-            if source in emails_map:
-                target = emails_map[source]
-                emails.append((target, result.id))
-            else:
-                target = phones_map[source]
-                phones.append((target, result.id))
-        amazonsqs.send_secret_santa_message(
-            {
-                "lang": data["language"],
-                "mails": emails,
-                "phones": phones,
-                "draw_id": draw.id,
-                "admin_email": data.get("admin_email"),
-            }
-        )
+        with transaction.atomic():
+            draw = models.SecretSanta()
+            draw.save()
+            result_instances = [
+                models.SecretSantaResult(source=source, target=target, draw=draw)
+                for source, target in results
+            ]
+            models.SecretSantaResult.objects.bulk_create(result_instances)
+            for result in result_instances:
+                if result.source in emails_map:
+                    emails.append((emails_map[result.source], result.id))
+                else:
+                    phones.append((phones_map[result.source], result.id))
+            amazonsqs.queue_secret_santa_message(
+                {
+                    "lang": data["language"],
+                    "mails": emails,
+                    "phones": phones,
+                    "draw_id": draw.id,
+                    "admin_email": data.get("admin_email"),
+                }
+            )
         LOG.info("Created secret santa results %s", results)
         headers = self.get_success_headers(serializer.data)
         return Response(
@@ -320,27 +467,28 @@ def secret_santa_resend_email(request, draw_pk, result_pk):
             status=400,
         )
 
-    # copy result:
-    new_result = get_object_or_404(models.SecretSantaResult, id=result_pk)
-    new_result.id = None
-    new_result.created_at = None
-    new_result.save()
+    with transaction.atomic():
+        # copy result:
+        new_result = get_object_or_404(models.SecretSantaResult, id=result_pk)
+        new_result.id = None
+        new_result.created_at = None
+        new_result.save()
 
-    # Invalidate previous:
-    result.valid = False
-    result.draw = None
-    result.save()
+        # Invalidate previous:
+        result.valid = False
+        result.draw = None
+        result.save()
 
-    payload = {
-        "lang": request.data["language"],
-    }
-    if "email" in request.data:
-        payload["mails"] = [(request.data["email"], new_result.id)]
-    elif "phone_number" in request.data:
-        payload["phones"] = [(request.data["phone_number"], new_result.id)]
-    else:
-        raise ValidationError("email or phone_number missing") from None
-    amazonsqs.send_secret_santa_message(payload)
+        payload = {
+            "lang": request.data["language"],
+        }
+        if "email" in request.data:
+            payload["mails"] = [(request.data["email"], new_result.id)]
+        elif "phone_number" in request.data:
+            payload["phones"] = [(request.data["phone_number"], new_result.id)]
+        else:
+            raise ValidationError("email or phone_number missing") from None
+        amazonsqs.queue_secret_santa_message(payload)
     LOG.info("Returning result %s", new_result)
     return Response({"new_result": new_result.id})
 
@@ -451,20 +599,35 @@ def revolut_accept(_, draw_id):
 class SocialNetworkCommentRaffleMixin:
     """Mixin for raffles on social network that use comments for the draw"""
 
-    def _ready_to_toss_check(self, draw):  # pylint: disable=no-self-use
-        # Check if a result is possible
+    @contextlib.contextmanager
+    def _fetching_comments(self, draw):  # pylint: disable=no-self-use
+        """Turns the errors fetching the comments into API errors"""
         try:
-            draw.generate_result()
+            yield
         except (tiktok.InvalidURL, instagram.InvalidURL):
             LOG.info("Invalid draw %s, cannot toss", draw.private_id, exc_info=True)
             raise ValidationError(f"Invalid post URL: {draw.post_url}") from None
         except (tiktok.NotFoundError, instagram.NotFoundError):
             LOG.info("Draw %s has no comments", draw.private_id, exc_info=True)
             raise ValidationError("The post has no comments") from None
+        except circuit_breaker.CircuitOpenError:
+            LOG.warning("Upstream unavailable, not tossing draw %s", draw.private_id)
+            raise APIException("Not available right now. Try again later.") from None
         except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
             LOG.error("Timed out tossing draw %s", draw.private_id, exc_info=True)
             raise APIException("Timed-out tossing. Try again later.") from None
 
+    def _ready_to_toss_check(self, draw):
+        with self._fetching_comments(draw):
+            super()._ready_to_toss_check(draw)
+
+    def _checked_toss(self, draw):
+        # The result that proves the draw can be tossed is the one saved,
+        # rather than fetching the comments again
+        with self._fetching_comments(draw):
+            value = draw.generate_result()
+        return draw.toss(value)
+
     @action(methods=["PATCH"], detail=True)
     def retoss(self, request, pk):
         LOG.info("Retossing draw with id: %s", pk)
@@ -476,11 +639,12 @@ class SocialNetworkCommentRaffleMixin:
         result = draw.results.order_by("created_at").last()
         if result is None:
             raise ValidationError(f"{draw} does not have any result")
-        self._ready_to_toss_check(draw)
+        with self._fetching_comments(draw):
+            new_comments = draw.fetch_comments()
 
         result.id = None
         result.created_at = None
-        new_comments = draw.fetch_comments()
+        result.comment_snapshot = draw.last_snapshot
 
         referenced_result_item = None
         for result_content in result.value:
@@ -508,6 +672,7 @@ class SocialNetworkCommentRaffleMixin:
 class TiktokViewSet(SocialNetworkCommentRaffleMixin, BaseDrawViewSet):
     MODEL = models.Tiktok
     serializer_class = serializers.TiktokSerializer
+    PREFETCH_RELATED = ("prize_set",)
 
     queryset = MODEL.objects.all()
 
@@ -515,6 +680,7 @@ class TiktokViewSet(SocialNetworkCommentRaffleMixin, BaseDrawViewSet):
 class InstagramViewSet(SocialNetworkCommentRaffleMixin, BaseDrawViewSet):
     MODEL = models.Instagram
     serializer_class = serializers.InstagramSerializer
+    PREFETCH_RELATED = ("prize_set",)
 
     queryset = MODEL.objects.all()
 
@@ -522,6 +688,7 @@ class InstagramViewSet(SocialNetworkCommentRaffleMixin, BaseDrawViewSet):
 class ShiftsViewSet(BaseDrawViewSet):
     MODEL = models.Shifts
     serializer_class = serializers.ShiftsSerializer
+    PREFETCH_RELATED = ("participant_set",)
 
     queryset = MODEL.objects.all()
 
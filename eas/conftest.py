@@ -0,0 +1,19 @@
+import pytest
+from django.core.cache import caches
+
+from eas.api import aws
+
+
+@pytest.fixture(autouse=True)
+def reset_aws_clients():
+    """Each test gets new AWS clients, so patches of boto3 take effect"""
+    aws.reset()
+    yield
+    aws.reset()
+
+
+@pytest.fixture(autouse=True)
+def clear_social_cache():
+    """Responses of the social network APIs don't leak between tests"""
+    yield
+    caches["social"].clear()
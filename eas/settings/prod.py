@@ -15,6 +15,36 @@ DATABASES = {
     }
 }
 
+# Caches need to be shared by all the gunicorn workers. Each cache gets its
+# own directory, culling or clearing one must not delete the entries of another
+def _shared_cache(name):
+    if os.environ.get("EAS_REDIS_URL"):
+        return {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["EAS_REDIS_URL"],
+            "KEY_PREFIX": name,
+        }
+    return {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(
+            os.environ.get("EAS_CACHE_DIR", "/tmp/eas-cache"), name
+        ),
+    }
+
+
+CACHES = {
+    "default": _shared_cache("default"),
+    "draws": {
+        **_shared_cache("draws"),
+        "TIMEOUT": 60 * 60,
+    },
+    "social": {
+        **_shared_cache("social"),
+        "TIMEOUT": 60 * 60,
+        "OPTIONS": {"MAX_ENTRIES": 500},  # Ignored by Redis, see maxmemory
+    },
+}
+
 
 # Sentry config
 INSTALLED_APPS = [